@@ -1,8 +1,11 @@
-from flask import Flask, request, jsonify, render_template
+from flask import Flask, request, jsonify, render_template, Response, stream_with_context, url_for
 import os
+import gc
 import json
 import requests
 import re
+import threading
+import time
 from dotenv import load_dotenv
 
 # Import your custom modules
@@ -29,19 +32,27 @@ from response_handler import (
     format_economic_data_response,
     format_top_movers_response
 )
-from visualization import create_price_chart
-# RAG Integration
-try:
-    from rag.rag_ingestion import RAGIngestion
-    from rag.rag_retrieval import get_rag_retrieval
-    RAG_AVAILABLE = True
-except ImportError:
+from visualization import (create_price_chart, get_chart_image, get_chart_render_pool, get_chart_cache,
+                           CHART_MODES, CHART_DATA_POINTS)
+# RAG Integration (torch, sentence-transformers and chromadb load on first use)
+from rag import rag_dependencies_available
+RAG_AVAILABLE = rag_dependencies_available()
+if RAG_AVAILABLE:
+    from rag.embeddings import get_embedding_service
+    from rag.ingestion_state import needs_ingestion, load_collection_manifest
+    from rag.rag_retrieval import get_rag_retrieval, reset_rag_retrieval
+else:
     print("RAG components not available. Running without RAG enhancement.")
-    RAG_AVAILABLE = False
 
 # Load environment variables
 load_dotenv()
 
+# Load the heavy subsystems in a background thread at startup instead of on the first request
+WARMUP_ON_START = os.getenv('WARMUP_ON_START', 'false').lower() == 'true'
+
+# Knowledge base ingestion at startup when the JSON files changed: "background", "blocking" or "off"
+RAG_INGEST_ON_START = os.getenv('RAG_INGEST_ON_START', 'background').lower()
+
 app = Flask(__name__)
 
 @app.route('/')
@@ -54,6 +65,7 @@ def chat():
     """Main chat endpoint that processes user messages"""
     try:
         user_input = request.json.get('message', '').strip()
+        chart_options = chart_options_from(request.json)
         
         if not user_input:
             return jsonify({'response': 'Please provide a message.'})
@@ -62,83 +74,180 @@ def chat():
         
         # Analyze user input to extract intent and parameters
         analysis = chatbot.analyze_user_input(user_input)
-        intent = analysis.get('intent')
         
-        print(f"DEBUG - Final intent: {intent}")
+        print(f"DEBUG - Final intent: {analysis.get('intent')}")
         print(f"DEBUG - Full analysis: {analysis}")
         
-        # Route to appropriate handler based on intent
-        if intent == 'greeting_conversation':
-            response = response_handler.handle_greetings_conversation(user_input)
+        result = build_chat_response(user_input, analysis, chart_options)
             
-        elif intent == 'answer_financial_query':
-            response = response_handler.answer_financial_query(user_input)
+    except Exception as e:
+        print(f"DEBUG - Error in chat route: {e}")
+        result = {'response': "I apologize, but I encountered an error while processing your request. Please try again."}
+    
+    return jsonify(result)
+
+# Intents whose replies are generated token by token by the LLM
+STREAMING_HANDLERS = {
+    'greeting_conversation': response_handler.stream_greetings_conversation,
+    'answer_financial_query': response_handler.stream_financial_query,
+}
+
+def sse_event(event, data):
+    """Format one server-sent event with a JSON payload"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@app.route('/chat/stream', methods=['POST'])
+def chat_stream():
+    """Streaming chat endpoint: sends the reply as server-sent events.
+
+    Events: "token" ({"text": ...}) for each LLM chunk of educational and
+    conversational replies, "message" (same payload as /chat) for all other
+    intents, "error" if the reply fails (including after some tokens were
+    sent), and a final "done".
+    """
+    user_input = (request.json or {}).get('message', '').strip()
+    chart_options = chart_options_from(request.json or {})
+    
+    def generate():
+        # No yield in a finally block: a client disconnect closes the
+        # generator, and yielding during close() raises RuntimeError
+        if not user_input:
+            yield sse_event('message', {'response': 'Please provide a message.'})
+            yield sse_event('done', {})
+            return
+        
+        try:
+            print(f"DEBUG - User input (stream): {user_input}")
             
-        elif intent == 'crypto_price_overview':
-            response = handle_crypto_price_request(analysis)
-                
-        elif intent == 'crypto_supply_info':
-            response = handle_crypto_supply_request(analysis)
-                
-        elif intent == 'crypto_ath_atl':
-            response = handle_crypto_ath_atl_request(analysis)
-                
-        elif intent == 'crypto_ohlc':
-            response = handle_crypto_ohlc_request(analysis)
-                
-        elif intent == 'crypto_exchange_info':
-            response = handle_crypto_exchange_request(analysis)
-                
-        elif intent == 'crypto_metadata':
-            response = handle_crypto_metadata_request(analysis)
-                
-        elif intent == 'stock_price_overview':
-            response = handle_stock_price_request(analysis)
-                
-        elif intent == 'stock_fundamentals':
-            response = handle_stock_fundamentals_request(analysis)
-                
-        elif intent == 'stock_earnings':
-            response = handle_stock_earnings_request(analysis)
-                
-        elif intent == 'stock_analyst_ratings':
-            response = handle_stock_analyst_ratings_request(analysis)
-                
-        elif intent == 'stock_insider_ownership':
-            response = handle_stock_insider_request(analysis)
-                
-        elif intent == 'stock_technicals':
-            response = handle_stock_technicals_request(analysis)
-                
-        elif intent == 'stock_ohlc':
-            response = handle_stock_ohlc_request(analysis)
-                
-        elif intent == 'forex_exchange_rate':
-            response = handle_forex_rate_request(analysis)
-                
-        elif intent == 'forex_ohlc':
-            response = handle_forex_ohlc_request(analysis)
-                
-        elif intent == 'forex_historical_rate':
-            response = handle_forex_historical_request(analysis)
+            analysis = chatbot.analyze_user_input(user_input)
+            intent = analysis.get('intent')
+            
+            print(f"DEBUG - Final intent: {intent}")
+            
+            stream_handler = STREAMING_HANDLERS.get(intent)
+            if stream_handler:
+                for chunk in stream_handler(user_input, analysis.get('answer')):
+                    yield sse_event('token', {'text': chunk})
+            else:
+                yield sse_event('message', build_chat_response(user_input, analysis, chart_options))
                 
-        elif intent == 'forex_economic_data':
-            response = handle_economic_data_request()
-
-        elif intent == 'chart':
-            return handle_chart_request(analysis)
+        except Exception as e:
+            print(f"DEBUG - Error in chat stream route: {e}")
+            yield sse_event('error', {'response': "I apologize, but I encountered an error while processing your request. Please try again."})
         
-        elif intent == 'top_market_movers':
-            response = handle_top_movers_request(analysis)
+        yield sse_event('done', {})
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+@app.route('/metrics/charts', methods=['GET'])
+def chart_metrics():
+    """Chart render pool and cache metrics: rendered charts/sec, queue depth, rejections, cache hits"""
+    stats = get_chart_render_pool().stats()
+    stats['cache'] = get_chart_cache().stats()
+    return jsonify(stats)
+
+@app.route('/chart/<chart_id>.<image_format>', methods=['GET'])
+def chart_image(chart_id, image_format):
+    """Chart image (png or webp) named by the chart_url of a chart reply"""
+    image = get_chart_image(chart_id, image_format)
+    if not image['success']:
+        if image.get('busy'):
+            return jsonify({'error': image['error']}), 503, {'Retry-After': '5'}
+        return jsonify({'error': image['error']}), 404 if image.get('not_found') else 502
+
+    response = Response(image['data'], mimetype=image['mimetype'])
+    response.set_etag(image['etag'])
+    response.cache_control.public = True
+    response.cache_control.max_age = image['max_age']
+    return response.make_conditional(request)
+
+def chart_options_from(payload):
+    """Chart output options of a chat request: chart_mode (image|data|ohlc) and chart_points"""
+    chart_mode = payload.get('chart_mode', 'image')
+    if chart_mode not in CHART_MODES:
+        chart_mode = 'image'
+    try:
+        chart_points = int(payload.get('chart_points') or CHART_DATA_POINTS)
+    except (TypeError, ValueError):
+        chart_points = CHART_DATA_POINTS
+    return {'chart_mode': chart_mode, 'chart_points': chart_points}
 
-        else:
-            response = "I understand you're asking about financial data, but I need more specific information. Try asking about stock prices, crypto data, or forex rates."
+def build_chat_response(user_input, analysis, chart_options=None):
+    """Route an analyzed message to its handler and return the JSON payload for the client"""
+    intent = analysis.get('intent')
+    
+    # Route to appropriate handler based on intent
+    if intent == 'greeting_conversation':
+        response = response_handler.handle_greetings_conversation(user_input, analysis.get('answer'))
+        
+    elif intent == 'answer_financial_query':
+        response = response_handler.answer_financial_query(user_input, analysis.get('answer'))
+        
+    elif intent == 'crypto_price_overview':
+        response = handle_crypto_price_request(analysis)
             
-    except Exception as e:
-        print(f"DEBUG - Error in chat route: {e}")
-        response = f"I apologize, but I encountered an error while processing your request. Please try again."
+    elif intent == 'crypto_supply_info':
+        response = handle_crypto_supply_request(analysis)
+            
+    elif intent == 'crypto_ath_atl':
+        response = handle_crypto_ath_atl_request(analysis)
+            
+    elif intent == 'crypto_ohlc':
+        response = handle_crypto_ohlc_request(analysis)
+            
+    elif intent == 'crypto_exchange_info':
+        response = handle_crypto_exchange_request(analysis)
+            
+    elif intent == 'crypto_metadata':
+        response = handle_crypto_metadata_request(analysis)
+            
+    elif intent == 'stock_price_overview':
+        response = handle_stock_price_request(analysis)
+            
+    elif intent == 'stock_fundamentals':
+        response = handle_stock_fundamentals_request(analysis)
+            
+    elif intent == 'stock_earnings':
+        response = handle_stock_earnings_request(analysis)
+            
+    elif intent == 'stock_analyst_ratings':
+        response = handle_stock_analyst_ratings_request(analysis)
+            
+    elif intent == 'stock_insider_ownership':
+        response = handle_stock_insider_request(analysis)
+            
+    elif intent == 'stock_technicals':
+        response = handle_stock_technicals_request(analysis)
+            
+    elif intent == 'stock_ohlc':
+        response = handle_stock_ohlc_request(analysis)
+            
+    elif intent == 'forex_exchange_rate':
+        response = handle_forex_rate_request(analysis)
+            
+    elif intent == 'forex_ohlc':
+        response = handle_forex_ohlc_request(analysis)
+            
+    elif intent == 'forex_historical_rate':
+        response = handle_forex_historical_request(analysis)
+            
+    elif intent == 'forex_economic_data':
+        response = handle_economic_data_request()
+
+    elif intent == 'chart':
+        return handle_chart_request(analysis, **(chart_options or {}))
+    
+    elif intent == 'top_market_movers':
+        response = handle_top_movers_request(analysis)
+
+    else:
+        response = "I understand you're asking about financial data, but I need more specific information. Try asking about stock prices, crypto data, or forex rates."
     
-    return jsonify({'response': response})
+    return {'response': response}
 
 # Helper functions for handling different request types
 def handle_crypto_price_request(analysis):
@@ -323,24 +432,24 @@ def handle_economic_data_request():
     data = data_fetcher.get_forex_economic_data()
     return format_economic_data_response(data)
 
-def handle_chart_request(analysis):
-    """Handle chart generation requests"""
+def handle_chart_request(analysis, chart_mode='image', chart_points=CHART_DATA_POINTS):
+    """Handle chart generation requests (an image URL, or the price series in data/ohlc mode)"""
     symbol = analysis.get('asset_symbol') or analysis.get('asset_name')
     time_period = analysis.get('time_period', '30d')
     asset_type = analysis.get('asset_type')
     
     if not symbol:
-        return jsonify({'response': 'Could not identify asset symbol for chart'})
+        return {'response': 'Could not identify asset symbol for chart'}
     
     valid_periods = ["1d", "7d", "30d", "90d", "1y"]
     if time_period not in valid_periods:
-        return jsonify({'response': f"Invalid time period. I can generate charts for: {', '.join(valid_periods)}"})
+        return {'response': f"Invalid time period. I can generate charts for: {', '.join(valid_periods)}"}
     
     if not asset_type:
-        return jsonify({'response': "Could not determine if this is a crypto or stock asset"})
+        return {'response': "Could not determine if this is a crypto or stock asset"}
     
     print(f"DEBUG - Creating chart for {symbol}, period: {time_period}, type: {asset_type}")
-    chart_result = create_price_chart(symbol, time_period, asset_type)
+    chart_result = create_price_chart(symbol, time_period, asset_type, mode=chart_mode, max_points=chart_points)
     
     if chart_result['success']:
         change_emoji = "📈" if chart_result['price_change'] >= 0 else "📉"
@@ -351,12 +460,19 @@ def handle_chart_request(analysis):
 
 📈 Chart generated successfully!"""
         
-        return jsonify({
+        if 'series' in chart_result:
+            return {
+                'response': response.strip(),
+                'chart_series': chart_result['series']
+            }
+        return {
             'response': response.strip(),
-            'chart': chart_result['chart_data']
-        })
+            'chart_url': url_for('chart_image', chart_id=chart_result['chart_id'], image_format='png')
+        }
+    elif chart_result.get('busy'):
+        return {'response': f"⏳ {chart_result['error']}"}
     else:
-        return jsonify({'response': f"❌ {chart_result['error']}"})
+        return {'response': f"❌ {chart_result['error']}"}
 
 
 def handle_top_movers_request(analysis):
@@ -385,24 +501,113 @@ def handle_top_movers_request(analysis):
     return response_handler.format_top_movers_response(data, asset_type, count)
 
 
+def run_rag_ingestion():
+    """Ingest the knowledge base, then make retrieval reload it"""
+    try:
+        # Imported here: the ingestion machinery is only needed when files changed
+        from rag.rag_ingestion import RAGIngestion
+        start = time.perf_counter()
+        ingestion = RAGIngestion()
+        ingestion.run_ingestion_if_needed()
+        reset_rag_retrieval()
+        print(f"✅ RAG ingestion finished in {time.perf_counter() - start:.1f}s")
+    except Exception as e:
+        print(f"❌ RAG ingestion failed: {e}")
+
+
 def initialize_rag():
-    """Initialize RAG system if available"""
+    """Initialize RAG system if available.
+
+    The up-to-date check only compares file fingerprints, so a normal start
+    never opens ChromaDB or loads the embedding model; both happen on the
+    first search (or in the warm-up thread).
+    """
+    if not RAG_AVAILABLE:
+        return
+    try:
+        if needs_ingestion(embedding_model_id=get_embedding_service().model_id):
+            if RAG_INGEST_ON_START == 'blocking':
+                run_rag_ingestion()
+            elif RAG_INGEST_ON_START == 'background':
+                print("📚 Knowledge base changed. Ingesting in the background...")
+                threading.Thread(target=run_rag_ingestion, name="rag-ingestion", daemon=True).start()
+                return
+            else:
+                print("⚠️ Knowledge base is out of date. Run `python -m rag.rag_ingestion` to update it.")
+        
+        manifest = load_collection_manifest()
+        if manifest and manifest.get('total_documents'):
+            print("✅ RAG system initialized successfully")
+            print(f"📊 Knowledge base contains {manifest['total_documents']} documents")
+        else:
+            print("⚠️ RAG system initialized but no knowledge available")
+    except Exception as e:
+        print(f"❌ RAG initialization failed: {e}")
+
+
+def preload_for_workers(workers=1):
+    """Load read-only state once in a pre-fork parent (gunicorn preload_app).
+
+    The embedding model weights and, with RAG_BACKEND=numpy, the vector
+    index are loaded before workers fork, so every worker shares those pages
+    copy-on-write instead of holding its own copy. gc.freeze() moves the
+    loaded objects out of the collector's reach so GC passes in the workers
+    don't write to (and un-share) them. No inference runs here: thread pools
+    started in the parent don't survive fork.
+
+    Unless EMBEDDING_THREADS is set, each of the `workers` processes gets an
+    equal share of the CPUs for inference, so they don't oversubscribe them.
+    """
+    if not RAG_AVAILABLE:
+        return
+    from rag.rag_retrieval import preload_shared_index
+    from rag.vector_backends import RAG_BACKEND
+
+    start = time.perf_counter()
+    service = get_embedding_service()
+    if service.backend == "torch" and service.sidecar is None:
+        worker_threads = service.num_threads or max(1, (os.cpu_count() or 1) // max(1, workers))
+        # Load with one thread (the loader applies num_threads) so the parent
+        # doesn't start an OpenMP pool
+        service.num_threads = 1
+        service.model  # loads the weights
+        service.num_threads = worker_threads
+    if RAG_BACKEND == "numpy":
+        preload_shared_index()
+    
+    gc.collect()
+    gc.freeze()
+    print(f"📦 Preloaded shared RAG state in {time.perf_counter() - start:.2f}s")
+
+
+def init_worker():
+    """Per-worker setup after fork (gunicorn post_fork)"""
     if RAG_AVAILABLE:
-        try:
-            # Run ingestion if needed
-            ingestion = RAGIngestion()
-            ingestion.run_ingestion_if_needed()
-            
-            # Test retrieval system
+        service = get_embedding_service()
+        if service.backend == "torch" and service.is_loaded:
+            import torch
+            torch.set_num_threads(service.num_threads)
+
+
+def warm_up():
+    """Load the embedding model, vector index and matplotlib ahead of first use"""
+    start = time.perf_counter()
+    try:
+        if RAG_AVAILABLE:
             rag = get_rag_retrieval()
             if rag.is_available():
-                print("✅ RAG system initialized successfully")
-                stats = rag.get_collection_stats()
-                print(f"📊 Knowledge base contains {stats['total_documents']} documents")
-            else:
-                print("⚠️ RAG system initialized but no knowledge available")
-        except Exception as e:
-            print(f"❌ RAG initialization failed: {e}")
+                rag.embed_query("warm up")
+        from matplotlib.backends import backend_agg  # noqa: F401
+        print(f"🔥 Warm-up finished in {time.perf_counter() - start:.2f}s")
+    except Exception as e:
+        print(f"⚠️ Warm-up failed: {e}")
+
+
+def start_warmup_thread():
+    """Run warm_up() in a daemon thread so it never delays serving requests"""
+    thread = threading.Thread(target=warm_up, name="warmup", daemon=True)
+    thread.start()
+    return thread
 
 
 @app.errorhandler(404)
@@ -424,12 +629,21 @@ if __name__ == '__main__':
         print(f"Warning: Missing environment variables: {', '.join(missing_vars)}")
         print("Some features may not work properly.")
     
-    # Initialize RAG system
-    initialize_rag()
+    # The debug reloader runs this block in a file-watching parent and again
+    # in the child that serves requests: only the child starts RAG work
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        # Initialize RAG system
+        initialize_rag()
+        
+        if WARMUP_ON_START:
+            start_warmup_thread()
     
     print("Starting Financial Chatbot...")
     print("Available endpoints:")
     print("- GET  /           : Chat interface")
     print("- POST /chat       : Chat API endpoint")
+    print("- POST /chat/stream: Streaming chat (server-sent events)")
+    print("- GET  /chart/<id>.png: Chart images (also .webp)")
+    print("- GET  /metrics/charts: Chart rendering metrics")
     
     app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
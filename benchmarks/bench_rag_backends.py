@@ -0,0 +1,88 @@
+"""Compare RAG vector search backends (ChromaDB HNSW vs in-memory NumPy).
+
+Embeds a query set built from the knowledge JSON files once, then times
+top-k search (plain and with a chunk_type filter) on each backend and checks
+that the NumPy results agree with Chroma's.
+
+Usage:
+    python -m benchmarks.bench_rag_backends [--top-k 5] [--repeat 20]
+"""
+import argparse
+import json
+import os
+import statistics
+import time
+
+from rag.embeddings import get_embedding_service
+from rag.rag_retrieval import RAGRetrieval
+from rag.vector_backends import ChromaBackend, NumpyBackend
+
+KNOWLEDGE_FILES = ["technical_strategies.json", "investment_styles.json", "risk_management.json"]
+
+
+def load_queries(rag_folder="rag"):
+    """Build benchmark queries from concept titles and use cases"""
+    queries = []
+    for json_file in KNOWLEDGE_FILES:
+        with open(os.path.join(rag_folder, json_file), "r", encoding="utf-8") as f:
+            for concept in json.load(f):
+                queries.append(concept["title"])
+                queries.append(f"how do traders use {concept['title']}")
+                queries.extend(concept.get("use_cases", [])[:1])
+    return queries
+
+
+def time_backend(backend, embeddings, top_k, repeat, where=None):
+    """Return per-query latencies in microseconds"""
+    latencies = []
+    for _ in range(repeat):
+        for embedding in embeddings:
+            start = time.perf_counter()
+            backend.query(embedding, n_results=top_k, where=where)
+            latencies.append((time.perf_counter() - start) * 1e6)
+    return latencies
+
+
+def report(name, latencies):
+    ordered = sorted(latencies)
+    p99 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))]
+    print(f"  {name:<8} mean={statistics.mean(latencies):8.1f}us  p50={statistics.median(latencies):8.1f}us  p99={p99:8.1f}us")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark RAG vector backends")
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    retrieval = RAGRetrieval(backend="chroma")
+    if retrieval.collection is None:
+        print("No collection found. Run `python -m rag.rag_ingestion` first.")
+        return
+
+    start = time.perf_counter()
+    numpy_backend = NumpyBackend.from_collection(retrieval.collection)
+    print(f"NumPy index: {numpy_backend.count()} vectors loaded in {(time.perf_counter() - start) * 1000:.1f}ms")
+    backends = {"chroma": ChromaBackend(retrieval.collection), "numpy": numpy_backend}
+
+    queries = load_queries()
+    embeddings = get_embedding_service().encode(queries)
+    print(f"Queries: {len(queries)}  top_k={args.top_k}  repeat={args.repeat}")
+
+    for label, where in (("unfiltered", None), ("chunk_type=example", {"chunk_type": "example"})):
+        print(f"\n{label}:")
+        for name, backend in backends.items():
+            backend.query(embeddings[0], n_results=args.top_k, where=where)  # warm-up
+            report(name, time_backend(backend, embeddings, args.top_k, args.repeat, where))
+
+        overlaps = []
+        for embedding in embeddings:
+            chroma_ids = {r['id'] for r in backends["chroma"].query(embedding, args.top_k, where)}
+            numpy_ids = {r['id'] for r in backends["numpy"].query(embedding, args.top_k, where)}
+            if chroma_ids:
+                overlaps.append(len(chroma_ids & numpy_ids) / len(chroma_ids))
+        print(f"  top-{args.top_k} agreement with Chroma: {statistics.mean(overlaps) * 100:.1f}%")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""Profile what importing a module costs, using `python -X importtime`.
+
+Imports the module in a fresh interpreter, then prints the total import time
+and the slowest top-level packages by cumulative time. Use it to check that
+heavy subsystems (torch, chromadb, matplotlib, pandas) are no longer pulled
+in at app import.
+
+Usage:
+    python -m benchmarks.import_profile [--module app] [--top 15]
+"""
+import argparse
+import re
+import subprocess
+import sys
+import time
+
+# "import time: self [us] | cumulative | imported package"
+IMPORT_LINE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+HEAVY_PACKAGES = ("torch", "sentence_transformers", "transformers", "chromadb", "matplotlib", "pandas", "onnxruntime")
+
+
+def profile_import(module):
+    """Return (wall seconds, [(package, self us, cumulative us, depth)]) for importing module"""
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            capture_output=True, text=True)
+    wall = time.perf_counter() - start
+    if result.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{result.stderr[-2000:]}")
+
+    entries = []
+    for line in result.stderr.splitlines():
+        match = IMPORT_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            entries.append((name, int(self_us), int(cumulative_us), (len(indent) - 1) // 2))
+    return wall, entries
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Report import-time cost of a module")
+    parser.add_argument("--module", default="app")
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    wall, entries = profile_import(args.module)
+    total_us = sum(self_us for _, self_us, _, _ in entries)
+    print(f"import {args.module}: {total_us / 1e6:.3f}s in imports, {wall:.3f}s interpreter wall time, "
+          f"{len(entries)} modules")
+
+    # Top-level packages (depth 0 entries carry the cumulative time of their subtree)
+    packages = {}
+    for name, _, cumulative_us, depth in entries:
+        if depth == 0:
+            root = name.split(".")[0]
+            packages[root] = packages.get(root, 0) + cumulative_us
+
+    print("\nSlowest top-level imports:")
+    for name, cumulative_us in sorted(packages.items(), key=lambda item: item[1], reverse=True)[:args.top]:
+        print(f"  {cumulative_us / 1000:9.1f}ms  {name}")
+
+    loaded = sorted({name.split(".")[0] for name, _, _, _ in entries} & set(HEAVY_PACKAGES))
+    print(f"\nHeavy packages imported: {', '.join(loaded) if loaded else 'none'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""Local stand-in for the Groq OpenAI-compatible chat completions API.
+
+Lets the chat pipeline be load-tested offline without calling Groq. Replies
+are deterministic: intent classification prompts are answered with the
+pattern-based classifier from intent_recognizer, everything else gets a
+canned answer. Latency follows a configurable log-normal distribution for
+time-to-first-token plus a per-token delay, and "stream": true requests are
+answered as server-sent events like the real API.
+
+Usage:
+    python -m benchmarks.llm_stub_server --port 8001 --ttft-ms 300 --token-ms 5
+    GROQ_URL=http://127.0.0.1:8001/openai/v1/chat/completions GROQ_API_KEY=stub python app.py
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+
+from flask import Flask, request, jsonify, Response
+
+import intent_recognizer
+
+app = Flask(__name__)
+
+CANNED_ANSWER = (
+    "This is a simulated answer from the local LLM stand-in. In a real deployment the model "
+    "would explain the financial concept you asked about, describe how it is used by traders "
+    "and investors, and point out its main advantages and limitations. Prices, ratios and "
+    "indicators mentioned here are illustrative only and should not be used for decisions. "
+    "Ask about a specific asset to get live market data instead of an explanation."
+)
+
+# Latency model, overridable from the command line
+config = {
+    "ttft_ms": 300.0,     # median time to first token
+    "ttft_sigma": 0.5,    # log-normal shape parameter for the first-token delay
+    "token_ms": 5.0,      # delay per generated token
+    "seed": 42,
+}
+
+_rng = random.Random(config["seed"])
+_rng_lock = threading.Lock()
+
+
+def sample_ttft():
+    """Draw a time-to-first-token delay in seconds"""
+    with _rng_lock:
+        factor = _rng.lognormvariate(0.0, config["ttft_sigma"])
+    return config["ttft_ms"] * factor / 1000.0
+
+
+def generate_reply(prompt, max_tokens):
+    """Build a deterministic reply for a prompt"""
+    if "financial intent classifier" in prompt:
+        match = re.search(r'USER QUERY: "(.*)"', prompt)
+        query = match.group(1) if match else ""
+        result = intent_recognizer.pattern_fallback_analysis(query)
+        if '"answer"' in prompt and result["intent"] in intent_recognizer.FAST_ANSWER_INTENTS:
+            result["answer"] = CANNED_ANSWER
+        return json.dumps(result)
+
+    words = CANNED_ANSWER.split()
+    return " ".join(words[:max_tokens])
+
+
+def split_tokens(text):
+    """Split text into word-sized pieces that behave like streamed tokens"""
+    return re.findall(r"\S+\s*", text)
+
+
+def completion_body(model, content, prompt):
+    return {
+        "id": f"chatcmpl-stub-{int(time.time() * 1000)}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": content},
+            "finish_reason": "stop"
+        }],
+        "usage": {
+            "prompt_tokens": len(prompt.split()),
+            "completion_tokens": len(split_tokens(content)),
+            "total_tokens": len(prompt.split()) + len(split_tokens(content))
+        }
+    }
+
+
+@app.route('/openai/v1/chat/completions', methods=['POST'])
+@app.route('/v1/chat/completions', methods=['POST'])
+@app.route('/chat/completions', methods=['POST'])
+def chat_completions():
+    """OpenAI-compatible chat completion endpoint"""
+    payload = request.get_json(force=True)
+    model = payload.get("model", "stub-model")
+    prompt = "\n".join(m.get("content", "") for m in payload.get("messages", []))
+    content = generate_reply(prompt, int(payload.get("max_tokens") or 400))
+    tokens = split_tokens(content)
+    ttft = sample_ttft()
+    token_delay = config["token_ms"] / 1000.0
+
+    if not payload.get("stream"):
+        time.sleep(ttft + token_delay * len(tokens))
+        return jsonify(completion_body(model, content, prompt))
+
+    def generate():
+        time.sleep(ttft)
+        for token in tokens:
+            chunk = {
+                "id": "chatcmpl-stub",
+                "object": "chat.completion.chunk",
+                "model": model,
+                "choices": [{"index": 0, "delta": {"content": token}, "finish_reason": None}]
+            }
+            yield f"data: {json.dumps(chunk)}\n\n"
+            time.sleep(token_delay)
+        done = {"id": "chatcmpl-stub", "object": "chat.completion.chunk", "model": model,
+                "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]}
+        yield f"data: {json.dumps(done)}\n\n"
+        yield "data: [DONE]\n\n"
+
+    return Response(generate(), mimetype='text/event-stream')
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local OpenAI-compatible LLM stand-in")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--ttft-ms", type=float, default=config["ttft_ms"], help="median time to first token")
+    parser.add_argument("--ttft-sigma", type=float, default=config["ttft_sigma"], help="log-normal sigma of the first-token delay")
+    parser.add_argument("--token-ms", type=float, default=config["token_ms"], help="delay per generated token")
+    parser.add_argument("--seed", type=int, default=config["seed"])
+    args = parser.parse_args()
+
+    config.update(ttft_ms=args.ttft_ms, ttft_sigma=args.ttft_sigma, token_ms=args.token_ms, seed=args.seed)
+    _rng.seed(args.seed)
+
+    print(f"LLM stand-in listening on http://{args.host}:{args.port}/openai/v1/chat/completions")
+    app.run(host=args.host, port=args.port, threaded=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""Closed-loop load generator for the chat endpoints.
+
+Sends a mix of chat messages to a running app with a fixed number of
+concurrent clients and reports throughput and latency percentiles. For
+/chat/stream it also reports time to first byte. Point the app at
+benchmarks/llm_stub_server.py to measure the pipeline without Groq.
+
+Usage:
+    python -m benchmarks.load_test --url http://127.0.0.1:5000 --requests 200 --concurrency 8 [--stream]
+"""
+import argparse
+import math
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+SAMPLE_MESSAGES = [
+    "hello",
+    "What is RSI?",
+    "Explain dollar cost averaging",
+    "what is the kelly criterion",
+    "How does a stop loss work?",
+    "What is the price of bitcoin?",
+    "EUR to USD exchange rate",
+    "top 5 cryptos",
+]
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a list of numbers"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, math.ceil(pct / 100.0 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def send_message(session, base_url, message, stream):
+    """Send one chat message; returns (ok, total_seconds, first_byte_seconds)"""
+    start = time.perf_counter()
+    endpoint = "/chat/stream" if stream else "/chat"
+    try:
+        with session.post(base_url + endpoint, json={"message": message}, timeout=60, stream=stream) as response:
+            first_byte = None
+            if stream:
+                for chunk in response.iter_content(chunk_size=None):
+                    if first_byte is None and chunk:
+                        first_byte = time.perf_counter() - start
+            else:
+                response.content
+                first_byte = time.perf_counter() - start
+            return response.ok, time.perf_counter() - start, first_byte
+    except requests.RequestException:
+        return False, time.perf_counter() - start, None
+
+
+def run(base_url, total, concurrency, stream):
+    sessions = [requests.Session() for _ in range(concurrency)]
+
+    def worker(i):
+        return send_message(sessions[i % concurrency], base_url, SAMPLE_MESSAGES[i % len(SAMPLE_MESSAGES)], stream)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(worker, range(total)))
+    elapsed = time.perf_counter() - start
+
+    latencies = [r[1] * 1000 for r in results if r[0]]
+    first_bytes = [r[2] * 1000 for r in results if r[0] and r[2] is not None]
+    errors = sum(1 for r in results if not r[0])
+
+    print(f"Requests: {total}  Concurrency: {concurrency}  Errors: {errors}  Endpoint: {'/chat/stream' if stream else '/chat'}")
+    print(f"Throughput: {len(latencies) / elapsed:.2f} req/s over {elapsed:.2f}s")
+    if latencies:
+        print(f"Latency ms  p50={percentile(latencies, 50):.1f}  p90={percentile(latencies, 90):.1f}  "
+              f"p99={percentile(latencies, 99):.1f}  max={max(latencies):.1f}  mean={statistics.mean(latencies):.1f}")
+    if stream and first_bytes:
+        print(f"TTFB ms     p50={percentile(first_bytes, 50):.1f}  p90={percentile(first_bytes, 90):.1f}  "
+              f"p99={percentile(first_bytes, 99):.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the chat endpoints")
+    parser.add_argument("--url", default="http://127.0.0.1:5000")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--stream", action="store_true", help="use /chat/stream and report time to first byte")
+    args = parser.parse_args()
+    run(args.url.rstrip("/"), args.requests, args.concurrency, args.stream)
+
+
+if __name__ == "__main__":
+    main()
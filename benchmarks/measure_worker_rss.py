@@ -0,0 +1,85 @@
+"""Report per-process memory of a running gunicorn master and its workers.
+
+Reads /proc/<pid>/smaps_rollup (Linux) for the master and each worker.
+RSS counts shared pages in every process. PSS divides shared pages between
+the processes that map them, so the PSS total is the real footprint of the
+deployment. Optionally sends warm-up requests first, so workers have loaded
+everything they load lazily.
+
+Usage:
+    python -m benchmarks.measure_worker_rss --pid <master pid> [--warmup-url http://localhost:5000] [--requests 20]
+"""
+import argparse
+import os
+
+import requests
+
+FIELDS = ("Rss", "Pss", "Shared_Clean", "Shared_Dirty", "Private_Clean", "Private_Dirty")
+
+
+def read_smaps_rollup(pid):
+    """Memory counters in kB for one process"""
+    values = {}
+    with open(f"/proc/{pid}/smaps_rollup", "r") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) >= 2 and parts[0].rstrip(":") in FIELDS:
+                values[parts[0].rstrip(":")] = int(parts[1])
+    return values
+
+
+def child_pids(pid):
+    """Direct children of pid, found through /proc/<pid>/stat parent IDs"""
+    children = []
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat", "r") as f:
+                # "pid (comm) state ppid ...": comm may contain spaces, so split after ')'
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        if ppid == pid:
+            children.append(int(entry))
+    return sorted(children)
+
+
+def warm_up(url, count):
+    """Send financial questions so every worker loads its lazy state"""
+    for i in range(count):
+        try:
+            requests.post(f"{url}/chat", json={"message": f"What is the RSI indicator? ({i})"}, timeout=60)
+        except requests.RequestException as e:
+            print(f"warm-up request failed: {e}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure RSS/PSS of gunicorn workers")
+    parser.add_argument("--pid", type=int, required=True, help="gunicorn master PID")
+    parser.add_argument("--warmup-url", help="send warm-up requests to this base URL first")
+    parser.add_argument("--requests", type=int, default=20)
+    args = parser.parse_args()
+
+    if args.warmup_url:
+        warm_up(args.warmup_url, args.requests)
+
+    processes = [("master", args.pid)] + [("worker", pid) for pid in child_pids(args.pid)]
+    print(f"{'role':<8} {'pid':>7} " + " ".join(f"{field:>14}" for field in FIELDS))
+
+    totals = dict.fromkeys(FIELDS, 0)
+    for role, pid in processes:
+        values = read_smaps_rollup(pid)
+        for field in FIELDS:
+            totals[field] += values.get(field, 0)
+        print(f"{role:<8} {pid:>7} " + " ".join(f"{values.get(field, 0) / 1024:11.1f} MB" for field in FIELDS))
+
+    print(f"{'total':<8} {'':>7} " + " ".join(f"{totals[field] / 1024:11.1f} MB" for field in FIELDS))
+    workers = len(processes) - 1
+    if workers:
+        worker_pss = sum(read_smaps_rollup(pid).get("Pss", 0) for _, pid in processes[1:]) / workers
+        print(f"\n{workers} workers, mean PSS per worker: {worker_pss / 1024:.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
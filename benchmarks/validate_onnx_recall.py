@@ -0,0 +1,92 @@
+"""Validate the int8 ONNX embedding backend against the float PyTorch model.
+
+Chunks the knowledge JSON files, embeds chunks and benchmark queries with
+both backends, and reports recall@k of the int8 top-k against the float
+top-k in two setups: everything re-embedded with int8 ("int8/int8") and
+int8 queries against an existing float collection ("int8/float"). Also
+reports query encoding latency and the float-vs-int8 cosine agreement.
+Exits non-zero when int8/int8 recall is below --min-recall.
+
+Usage:
+    python -m benchmarks.validate_onnx_recall [--k 5] [--min-recall 0.9]
+"""
+import argparse
+import statistics
+import sys
+import time
+
+import numpy as np
+
+from benchmarks.bench_rag_backends import KNOWLEDGE_FILES, load_queries
+from rag.chunking import chunk_concepts, iter_json_array
+from rag.embeddings import EmbeddingService
+
+
+def load_chunks(rag_folder="rag"):
+    chunks = []
+    for json_file in KNOWLEDGE_FILES:
+        chunks.extend(chunk_concepts(list(iter_json_array(f"{rag_folder}/{json_file}")), json_file))
+    return [chunk["content"] for chunk in chunks]
+
+
+def top_k(doc_vectors, query_vectors, k):
+    return np.argsort(-(query_vectors @ doc_vectors.T), axis=1, kind='stable')[:, :k]
+
+
+def recall_at_k(reference, candidate):
+    return statistics.mean(len(set(ref) & set(cand)) / len(ref) for ref, cand in zip(reference, candidate))
+
+
+def time_queries(service, queries):
+    """Per-query encode latency in milliseconds (batch of one, as in retrieval)"""
+    service.encode(queries[:1])  # warm-up
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        service.encode([query])
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check int8 ONNX embedding recall against the float model")
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--min-recall", type=float, default=0.9)
+    args = parser.parse_args()
+
+    float_service = EmbeddingService(backend="torch")
+    int8_service = EmbeddingService(backend="onnx-int8")
+    if int8_service.backend != "onnx-int8":
+        print("onnxruntime is not installed; nothing to validate.")
+        return 1
+
+    documents = load_chunks()
+    queries = load_queries()
+    print(f"Documents: {len(documents)}  queries: {len(queries)}  k={args.k}")
+
+    float_docs, float_queries = float_service.encode(documents), float_service.encode(queries)
+    int8_docs, int8_queries = int8_service.encode(documents), int8_service.encode(queries)
+
+    reference = top_k(float_docs, float_queries, args.k)
+    recall_int8 = recall_at_k(reference, top_k(int8_docs, int8_queries, args.k))
+    recall_mixed = recall_at_k(reference, top_k(float_docs, int8_queries, args.k))
+    agreement = np.sum(float_docs * int8_docs, axis=1) / (
+        np.linalg.norm(float_docs, axis=1) * np.linalg.norm(int8_docs, axis=1))
+
+    print(f"recall@{args.k} int8/int8:  {recall_int8 * 100:.1f}%")
+    print(f"recall@{args.k} int8/float: {recall_mixed * 100:.1f}%")
+    print(f"float vs int8 cosine: mean={agreement.mean():.4f} min={agreement.min():.4f}")
+
+    for name, service in (("torch", float_service), ("onnx-int8", int8_service)):
+        latencies = time_queries(service, queries)
+        print(f"  {name:<10} query encode p50={statistics.median(latencies):6.2f}ms  "
+              f"mean={statistics.mean(latencies):6.2f}ms")
+
+    if recall_int8 < args.min_recall:
+        print(f"FAIL: recall below {args.min_recall * 100:.0f}%")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,48 @@
+"""Gunicorn settings for multi-process serving.
+
+    gunicorn app:app
+
+The app is imported once in the master (preload_app), which then loads the
+embedding model and, with RAG_BACKEND=numpy, the vector index before
+forking workers. Workers share that memory copy-on-write; ChromaDB is
+opened by each worker after the fork. Per-worker memory can be checked
+with `python -m benchmarks.measure_worker_rss --pid <master pid>`.
+
+Alternatively, start `python -m rag.embedding_server` and set
+EMBEDDING_SIDECAR_SOCKET: workers then send encode requests to that single
+model process, which batches them, and never load the model themselves.
+"""
+import os
+import subprocess
+import sys
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:5000')
+workers = int(os.getenv('GUNICORN_WORKERS', '4'))
+worker_class = 'gthread'
+threads = int(os.getenv('GUNICORN_THREADS', '4'))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '60'))
+preload_app = True
+
+
+def on_starting(server):
+    # Ingest in a separate process so the master never runs model inference
+    # (torch/OpenMP thread pools started before fork hang in the workers)
+    if os.getenv('RAG_INGEST_ON_START', 'background').lower() == 'off':
+        return
+    from rag import rag_dependencies_available
+    from rag.embeddings import get_embedding_service
+    from rag.ingestion_state import needs_ingestion
+    if rag_dependencies_available() and needs_ingestion(embedding_model_id=get_embedding_service().model_id):
+        server.log.info("Knowledge base changed, running ingestion")
+        subprocess.run([sys.executable, "-m", "rag.rag_ingestion"], check=False)
+
+
+def when_ready(server):
+    # Runs in the master after the app is imported and before workers fork
+    import app
+    app.preload_for_workers(workers=server.cfg.workers)
+
+
+def post_fork(server, worker):
+    import app
+    app.init_worker()
@@ -3,9 +3,35 @@ import json
 import re
 import os
 from dotenv import load_dotenv
+from rag import rag_dependencies_available
 
 load_dotenv()
 
+GROQ_URL = os.getenv('GROQ_URL', "https://api.groq.com/openai/v1/chat/completions")  # Override to point at a local stand-in
+
+FAST_ANSWER_ENABLED = os.getenv('FAST_ANSWER_ENABLED', 'true').lower() == 'true'
+
+# Intents the classifier may answer directly in the same call (fast path).
+# With RAG, educational answers come from one knowledge-grounded call instead,
+# so drafting them here would only add tokens to every classification.
+if rag_dependencies_available():
+    FAST_ANSWER_INTENTS = ("greeting_conversation",)
+    FAST_ANSWER_MAX_TOKENS = 300
+else:
+    FAST_ANSWER_INTENTS = ("greeting_conversation", "answer_financial_query")
+    FAST_ANSWER_MAX_TOKENS = 600
+
+FAST_ANSWER_GUIDELINES = {
+    "greeting_conversation": "reply warmly and briefly, and guide the user toward what you can help with (stock prices, crypto data, forex rates, financial questions).",
+    "answer_financial_query": "answer clearly and accurately in 2-3 short paragraphs, using simple language, and answer only what is asked."
+}
+
+FAST_ANSWER_INSTRUCTIONS = f"""
+ FAST ANSWER:
+ - If the intent is {' or '.join(FAST_ANSWER_INTENTS)}, ALSO add an "answer" field to the JSON containing your complete reply to the user.
+""" + "".join(f" - For {intent}: {FAST_ANSWER_GUIDELINES[intent]}\n" for intent in FAST_ANSWER_INTENTS) + """ - For every other intent, set "answer" to null.
+"""
+
 def analyze_user_input(user_input):
     """Analyze user input using LLM-first approach with smart fallback"""
     groq_api_key = os.getenv('GROQ_API_KEY')
@@ -17,14 +43,21 @@ def analyze_user_input(user_input):
     return llm_intent_analysis(user_input, groq_api_key)
 
 def llm_intent_analysis(user_input, groq_api_key):
-    """Primary LLM-based intent analysis"""
-    groq_url = "https://api.groq.com/openai/v1/chat/completions"
-    
+    """Primary LLM-based intent analysis.
+
+    When FAST_ANSWER_ENABLED is set, the classifier also drafts the reply for
+    FAST_ANSWER_INTENTS (greetings, plus educational queries when RAG is not
+    available) and returns it in the "answer" field, so the response handlers
+    can skip a second LLM round trip.
+    """
     headers = {
         "Authorization": f"Bearer {groq_api_key}",
         "Content-Type": "application/json"
     }
     
+    answer_field = ', "answer": "reply_or_null"' if FAST_ANSWER_ENABLED else ""
+    answer_instructions = FAST_ANSWER_INSTRUCTIONS if FAST_ANSWER_ENABLED else ""
+
     prompt = f"""You are a financial intent classifier. Analyze the user query and return ONLY a JSON object.
 
  AVAILABLE INTENTS:
@@ -113,8 +146,8 @@ def llm_intent_analysis(user_input, groq_api_key):
  USER QUERY: "{user_input}"
 
  Return ONLY this JSON:
- {{"intent": "intent_name", "asset_name": "name_if_found", "asset_symbol": "SYMBOL_IF_FOUND",  "asset_type": "crypto_or_stock_or_null", "base_currency": "BASE_IF_FOREX", "quote_currency": "QUOTE_IF_FOREX", "time_period": "period_if_chart", "timeframe": null, "date_range": null, "limit": "Number_or_null"}}
-
+ {{"intent": "intent_name", "asset_name": "name_if_found", "asset_symbol": "SYMBOL_IF_FOUND",  "asset_type": "crypto_or_stock_or_null", "base_currency": "BASE_IF_FOREX", "quote_currency": "QUOTE_IF_FOREX", "time_period": "period_if_chart", "timeframe": null, "date_range": null, "limit": "Number_or_null"{answer_field}}}
+{answer_instructions}
  Be precise. If someone asks "what is the price of bitcoin" they want DATA not education. Also tesla ohlc data is stock ohlc not crypto ohlc.
 
  Also extract timeframe for OHLC data for both crypto and stocks.
@@ -124,11 +157,11 @@ def llm_intent_analysis(user_input, groq_api_key):
         "model": "llama-3.1-8b-instant",
         "messages": [{"role": "user", "content": prompt}],
         "temperature": 0.1,
-        "max_tokens": 200
+        "max_tokens": FAST_ANSWER_MAX_TOKENS if FAST_ANSWER_ENABLED else 200  # Room for the drafted answer
     }
     
     try:
-        response = requests.post(groq_url, headers=headers, json=payload, timeout=10)
+        response = requests.post(GROQ_URL, headers=headers, json=payload, timeout=10)
         response.raise_for_status()
         
         content = response.json()['choices'][0]['message']['content'].strip()
@@ -141,10 +174,14 @@ def llm_intent_analysis(user_input, groq_api_key):
         json_match = re.search(r'\{.*\}', content, re.DOTALL)
         if json_match:
             json_str = json_match.group()
-            result = json.loads(json_str)
+            # strict=False tolerates raw newlines inside the drafted answer
+            result = json.loads(json_str, strict=False)
             
             # Validate result
             if isinstance(result, dict) and 'intent' in result:
+                # Only keep drafted answers for intents that can use them
+                if result.get('intent') not in FAST_ANSWER_INTENTS or not isinstance(result.get('answer'), str):
+                    result['answer'] = None
                 print(f"DEBUG - Parsed LLM result: {result}")
                 return result
         
@@ -342,5 +379,6 @@ def create_intent_response(intent, asset_symbol=None, asset_name=None, asset_typ
         "time_period": time_period,
         "timeframe": timeframe,
         "date_range": None,
-        "limit":limit
+        "limit":limit,
+        "answer": None
     }
\ No newline at end of file
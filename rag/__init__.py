@@ -0,0 +1,9 @@
+import importlib.util
+
+# Packages RAG needs at runtime; they are imported on first use, not here
+RAG_DEPENDENCIES = ("chromadb", "sentence_transformers")
+
+
+def rag_dependencies_available() -> bool:
+    """Check that the RAG dependencies are installed without importing them"""
+    return all(importlib.util.find_spec(name) is not None for name in RAG_DEPENDENCIES)
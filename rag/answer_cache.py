@@ -0,0 +1,176 @@
+import os
+import re
+import time
+import threading
+from collections import OrderedDict
+from typing import Callable, Optional
+import logging
+
+import numpy as np
+
+from rag.ingestion_state import COLLECTION_MANIFEST_FILE, load_collection_manifest
+
+logger = logging.getLogger(__name__)
+
+ANSWER_CACHE_ENABLED = os.getenv('ANSWER_CACHE_ENABLED', 'true').lower() == 'true'
+ANSWER_CACHE_THRESHOLD = float(os.getenv('ANSWER_CACHE_THRESHOLD', '0.92'))
+ANSWER_CACHE_TTL = float(os.getenv('ANSWER_CACHE_TTL', '86400'))
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv('ANSWER_CACHE_MAX_ENTRIES', '500'))
+
+
+def normalize_question(question: str) -> str:
+    """Lowercase and collapse whitespace/trailing punctuation for exact-match lookups"""
+    question = re.sub(r'\s+', ' ', question.strip().lower())
+    return question.rstrip('?!. ')
+
+
+class SemanticAnswerCache:
+    """Cache of LLM answers keyed by question meaning.
+
+    A new question is embedded and compared (cosine similarity) with previously
+    answered ones; above the threshold the stored answer is reused. Entries
+    expire after ttl_seconds, the cache is LRU-bounded to max_entries, and it
+    is dropped whenever the knowledge base content changes: the content_hash
+    in the collection manifest is compared, and the manifest is only re-read
+    when its mtime changes, so rewrites without new content keep the cache.
+    """
+
+    def __init__(self, embed_fn: Callable[[str], np.ndarray],
+                 similarity_threshold: float = ANSWER_CACHE_THRESHOLD,
+                 ttl_seconds: float = ANSWER_CACHE_TTL,
+                 max_entries: int = ANSWER_CACHE_MAX_ENTRIES,
+                 rag_folder: str = "rag"):
+        self.embed_fn = embed_fn
+        self.similarity_threshold = similarity_threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.rag_folder = rag_folder
+        self.manifest_path = os.path.join(rag_folder, COLLECTION_MANIFEST_FILE)
+        self._manifest_mtime = None
+        self._content_hash = None
+
+        self._entries = OrderedDict()  # normalized question -> entry dict
+        self._lock = threading.Lock()
+        self._version = self._knowledge_version()
+        self.hits = 0
+        self.misses = 0
+
+    def _knowledge_version(self) -> Optional[str]:
+        """Content hash of the ingested knowledge base (None if unknown)"""
+        try:
+            mtime = os.stat(self.manifest_path).st_mtime_ns
+        except OSError:
+            mtime = None
+        if mtime != self._manifest_mtime:
+            manifest = load_collection_manifest(self.rag_folder) if mtime is not None else None
+            self._content_hash = (manifest or {}).get("content_hash")
+            self._manifest_mtime = mtime
+        return self._content_hash
+
+    def _check_version(self):
+        """Drop all entries if the knowledge base changed since they were stored"""
+        version = self._knowledge_version()
+        if version != self._version:
+            logger.info("Knowledge base changed. Clearing semantic answer cache.")
+            self._entries.clear()
+            self._version = version
+
+    def _embed(self, question: str) -> np.ndarray:
+        embedding = np.asarray(self.embed_fn(question), dtype=np.float32).reshape(-1)
+        norm = np.linalg.norm(embedding)
+        return embedding / norm if norm > 0 else embedding
+
+    def _evict_expired(self, now: float):
+        expired = [key for key, entry in self._entries.items()
+                   if now - entry['created'] > self.ttl_seconds]
+        for key in expired:
+            del self._entries[key]
+
+    def lookup(self, question: str) -> Optional[str]:
+        """Return a cached answer for a question with the same meaning, if any"""
+        key = normalize_question(question)
+        now = time.time()
+
+        with self._lock:
+            self._check_version()
+            self._evict_expired(now)
+
+            # Exact (normalized) repeat: no embedding needed
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry['answer']
+
+            if not self._entries:
+                self.misses += 1
+                return None
+
+            keys = list(self._entries.keys())
+            matrix = np.stack([self._entries[k]['embedding'] for k in keys])
+
+        query = self._embed(question)
+        similarities = matrix @ query
+        best = int(np.argmax(similarities))
+
+        with self._lock:
+            if similarities[best] >= self.similarity_threshold and keys[best] in self._entries:
+                self._entries.move_to_end(keys[best])
+                self.hits += 1
+                logger.info(f"Semantic cache hit ({similarities[best]:.3f}) for '{question}'")
+                return self._entries[keys[best]]['answer']
+            self.misses += 1
+            return None
+
+    def store(self, question: str, answer: str):
+        """Remember the answer given to a question"""
+        if not answer:
+            return
+        embedding = self._embed(question)
+        key = normalize_question(question)
+
+        with self._lock:
+            self._check_version()
+            self._entries[key] = {
+                'embedding': embedding,
+                'answer': answer,
+                'created': time.time()
+            }
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self):
+        """Drop every cached answer"""
+        with self._lock:
+            self._entries.clear()
+            self._version = self._knowledge_version()
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+# Global instance for easy access
+_answer_cache = None
+
+def get_answer_cache() -> Optional[SemanticAnswerCache]:
+    """Get global semantic answer cache (None when disabled)"""
+    global _answer_cache
+    if not ANSWER_CACHE_ENABLED:
+        return None
+    if _answer_cache is None:
+        from rag.rag_retrieval import get_rag_retrieval
+
+        # Share the retrieval query-embedding cache, so a question is encoded
+        # once for both the answer cache and the knowledge search
+        def embed(question):
+            return get_rag_retrieval().embed_query(question)
+
+        _answer_cache = SemanticAnswerCache(embed)
+    return _answer_cache
+
+def invalidate_answer_cache():
+    """Clear the global answer cache, e.g. after the knowledge base is re-ingested"""
+    if _answer_cache is not None:
+        _answer_cache.invalidate()
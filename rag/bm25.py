@@ -0,0 +1,138 @@
+import json
+import math
+import os
+import re
+from collections import Counter, defaultdict
+from typing import List, Tuple, Dict, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+BM25_INDEX_FILE = "bm25_index.json"
+
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:\.[0-9]+)?")
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "can", "do", "does", "for", "from", "how",
+    "i", "in", "is", "it", "its", "me", "of", "on", "or", "the", "this", "to", "what", "when",
+    "which", "with", "you", "your", "explain", "tell", "about", "use", "used"
+}
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word/number tokens without stopwords"""
+    return [token for token in _TOKEN_PATTERN.findall(text.lower()) if token not in STOPWORDS]
+
+
+class BM25Builder:
+    """Accumulates documents during ingestion and builds a BM25Index"""
+
+    def __init__(self, title_weight: int = 2):
+        self.title_weight = title_weight
+        self.ids = []
+        self.doc_lengths = []
+        self.postings = defaultdict(list)  # term -> [[doc index, term frequency], ...]
+
+    def add(self, doc_id: str, text: str, title: str = ""):
+        # Titles are repeated so a keyword hit on the concept name outweighs a passing mention
+        tokens = tokenize(text) + tokenize(title) * self.title_weight
+        doc_index = len(self.ids)
+        self.ids.append(doc_id)
+        self.doc_lengths.append(len(tokens))
+        for term, tf in Counter(tokens).items():
+            self.postings[term].append([doc_index, tf])
+
+    def build(self, k1: float = 1.5, b: float = 0.75) -> "BM25Index":
+        return BM25Index(self.ids, self.doc_lengths, dict(self.postings), k1=k1, b=b)
+
+
+class BM25Index:
+    """Okapi BM25 inverted index over chunk text and titles"""
+
+    def __init__(self, ids: List[str], doc_lengths: List[int], postings: Dict[str, List[List[int]]],
+                 k1: float = 1.5, b: float = 0.75):
+        self.ids = ids
+        self.doc_lengths = doc_lengths
+        self.postings = postings
+        self.k1 = k1
+        self.b = b
+        self.avg_doc_length = (sum(doc_lengths) / len(doc_lengths)) if doc_lengths else 0.0
+
+        n_docs = len(ids)
+        self.idf = {
+            term: math.log(1 + (n_docs - len(docs) + 0.5) / (len(docs) + 0.5))
+            for term, docs in postings.items()
+        }
+
+    def search(self, query: str, top_k: int = 10) -> List[Tuple[str, float]]:
+        """Return (doc id, BM25 score) pairs for the best-matching documents"""
+        return [(doc_id, score) for doc_id, score, _, _ in self.search_with_coverage(query, top_k)]
+
+    def search_with_coverage(self, query: str, top_k: int = 10) -> List[Tuple[str, float, float, int]]:
+        """Return (doc id, BM25 score, term coverage, matched terms) for the best-matching documents.
+
+        Coverage is the IDF-weighted share of the query's terms found in the
+        document, from 0 to 1. Terms missing from the whole index count at the
+        highest possible IDF. Single-character tokens (the "s" of "what's")
+        are ignored. Matched terms is the number of distinct query terms the
+        document contains: a one-word query covers itself fully in any chunk
+        that mentions the word, so coverage alone is weak evidence.
+        """
+        if not self.ids:
+            return []
+
+        terms = set(tokenize(query))
+        unseen_idf = math.log(1 + (len(self.ids) + 0.5) / 0.5)
+        query_weight = sum(self.idf.get(term, unseen_idf) for term in terms if len(term) > 1)
+
+        scores = defaultdict(float)
+        matched = defaultdict(float)
+        matched_terms = defaultdict(int)
+        for term in terms:
+            idf = self.idf.get(term)
+            if idf is None:
+                continue
+            for doc_index, tf in self.postings[term]:
+                norm = 1 - self.b + self.b * self.doc_lengths[doc_index] / (self.avg_doc_length or 1)
+                scores[doc_index] += idf * tf * (self.k1 + 1) / (tf + self.k1 * norm)
+                if len(term) > 1:
+                    matched[doc_index] += idf
+                    matched_terms[doc_index] += 1
+
+        best = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:top_k]
+        return [(self.ids[doc_index], score, matched[doc_index] / query_weight if query_weight else 0.0,
+                 matched_terms[doc_index])
+                for doc_index, score in best]
+
+    def save(self, path: str):
+        # Write-then-rename: serving processes may load the index while it is rewritten
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({
+                "k1": self.k1,
+                "b": self.b,
+                "ids": self.ids,
+                "doc_lengths": self.doc_lengths,
+                "postings": self.postings
+            }, f)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> Optional["BM25Index"]:
+        try:
+            with open(path, "r") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"Could not load BM25 index from {path}: {e}")
+            return None
+        return cls(data["ids"], data["doc_lengths"], data["postings"], k1=data["k1"], b=data["b"])
+
+
+def reciprocal_rank_fusion(rankings: List[List[str]], k: int = 60) -> Dict[str, float]:
+    """Fuse several ranked ID lists: score(d) = sum over lists of 1 / (k + rank)"""
+    fused = defaultdict(float)
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, 1):
+            fused[doc_id] += 1.0 / (k + rank)
+    return dict(fused)
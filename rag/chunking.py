@@ -0,0 +1,186 @@
+import json
+from typing import List, Dict, Any, Iterator
+
+# Characters read per step when streaming a JSON file
+JSON_READ_SIZE = 64 * 1024
+
+
+# The template indentation below is part of the stored chunk text, and therefore
+# of each chunk's content-hash ID; changing it re-embeds the whole knowledge base.
+def create_document_chunks(concept: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Create multiple document chunks from a single concept"""
+    chunks = []
+    
+    # Main concept chunk
+    main_content = f"""
+        Title: {concept['title']}
+        Category: {concept['category']}
+        
+        Concept: {concept['concept']}
+        
+        Calculation: {concept.get('calculation', 'N/A')}
+        
+        Parameters: {concept.get('parameters', 'N/A')}
+        """
+    
+    chunks.append({
+        'content': main_content.strip(),
+        'metadata': {
+            'title': concept['title'],
+            'category': concept['category'],
+            'chunk_type': 'main_concept',
+            'source': concept.get('source_file', 'unknown')
+        }
+    })
+    
+    # Use cases chunk
+    if concept.get('use_cases'):
+        use_cases_content = f"""
+            {concept['title']} - Use Cases:
+            
+            {chr(10).join([f"• {use_case}" for use_case in concept['use_cases']])}
+            """
+        
+        chunks.append({
+            'content': use_cases_content.strip(),
+            'metadata': {
+                'title': concept['title'],
+                'category': concept['category'],
+                'chunk_type': 'use_cases',
+                'source': concept.get('source_file', 'unknown')
+            }
+        })
+    
+    # Advantages and disadvantages chunk
+    advantages = concept.get('advantages', [])
+    disadvantages = concept.get('disadvantages', [])
+    
+    if advantages or disadvantages:
+        pros_cons_content = f"{concept['title']} - Pros and Cons:\n\n"
+        
+        if advantages:
+            pros_cons_content += f"Advantages:\n{chr(10).join([f'• {adv}' for adv in advantages])}\n\n"
+        
+        if disadvantages:
+            pros_cons_content += f"Disadvantages:\n{chr(10).join([f'• {dis}' for dis in disadvantages])}"
+        
+        chunks.append({
+            'content': pros_cons_content.strip(),
+            'metadata': {
+                'title': concept['title'],
+                'category': concept['category'],
+                'chunk_type': 'pros_cons',
+                'source': concept.get('source_file', 'unknown')
+            }
+        })
+    
+    # Example chunk
+    if concept.get('example'):
+        example_content = f"""
+            {concept['title']} - Example:
+            
+            {concept['example']}
+            """
+        
+        chunks.append({
+            'content': example_content.strip(),
+            'metadata': {
+                'title': concept['title'],
+                'category': concept['category'],
+                'chunk_type': 'example',
+                'source': concept.get('source_file', 'unknown')
+            }
+        })
+    
+    # Variations chunk
+    if concept.get('variations'):
+        variations_content = f"""
+            {concept['title']} - Variations:
+            
+            {chr(10).join([f"• {var}" for var in concept['variations']])}
+            """
+        
+        chunks.append({
+            'content': variations_content.strip(),
+            'metadata': {
+                'title': concept['title'],
+                'category': concept['category'],
+                'chunk_type': 'variations',
+                'source': concept.get('source_file', 'unknown')
+            }
+        })
+    
+    return chunks
+
+
+def chunk_concepts(concepts: List[Dict[str, Any]], source_file: str) -> List[Dict[str, Any]]:
+    """Chunk a batch of concepts from one source file (process-pool task)"""
+    chunks = []
+    for concept in concepts:
+        concept['source_file'] = source_file
+        chunks.extend(create_document_chunks(concept))
+    return chunks
+
+
+def iter_json_array(filepath: str, read_size: int = JSON_READ_SIZE) -> Iterator[Any]:
+    """Yield the elements of a top-level JSON array one at a time.
+
+    Parses incrementally with JSONDecoder.raw_decode over a sliding buffer, so
+    memory is bounded by the largest single element rather than the file.
+    """
+    decoder = json.JSONDecoder()
+    with open(filepath, 'r', encoding='utf-8') as f:
+        buffer = ""
+        pos = 0
+        eof = False
+        started = False
+
+        def fill():
+            nonlocal buffer, pos, eof
+            data = f.read(read_size)
+            if not data:
+                eof = True
+            buffer = buffer[pos:] + data
+            pos = 0
+
+        while True:
+            # Skip whitespace and separators, reading more input as needed
+            while True:
+                while pos < len(buffer) and buffer[pos] in " \t\r\n":
+                    pos += 1
+                if pos < len(buffer) or eof:
+                    break
+                fill()
+
+            if pos >= len(buffer):
+                if started:
+                    raise ValueError(f"Unexpected end of JSON array in {filepath}")
+                return
+
+            char = buffer[pos]
+            if not started:
+                if char != '[':
+                    raise ValueError(f"{filepath} does not contain a JSON array")
+                started = True
+                pos += 1
+                continue
+            if char == ']':
+                return
+            if char == ',':
+                pos += 1
+                continue
+
+            try:
+                element, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                fill()
+                continue
+            # A value not followed by a delimiter may be truncated: raw_decode
+            # accepts the prefix "7" of "7.5e10" if the buffer ends mid-number
+            if not eof and (end == len(buffer) or buffer[end] not in " \t\r\n,]"):
+                fill()
+                continue
+            pos = end
+            yield element
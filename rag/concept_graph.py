@@ -0,0 +1,108 @@
+import json
+import os
+from typing import List, Dict, Any, Optional
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+CONCEPT_GRAPH_FILE = "concept_graph.json"
+
+# Related concepts stored per concept
+CONCEPT_GRAPH_NEIGHBORS = int(os.getenv('CONCEPT_GRAPH_NEIGHBORS', '10'))
+
+
+class ConceptGraph:
+    """Concept-to-concept similarity graph, precomputed at ingestion.
+
+    concepts maps a lowercased title to its representative chunk (the
+    main_concept chunk) and neighbors maps it to [title, cosine similarity]
+    pairs, most similar first, so lookups are plain dictionary reads.
+    """
+
+    def __init__(self, concepts: Dict[str, Dict[str, Any]], neighbors: Dict[str, List[List[Any]]]):
+        self.concepts = concepts
+        self.neighbors = neighbors
+
+    def related(self, concept_title: str, top_k: int = 3) -> Optional[List[Dict[str, Any]]]:
+        """Representative chunks of the concepts closest to concept_title (None if unknown)"""
+        neighbors = self.neighbors.get(concept_title.strip().lower())
+        if neighbors is None:
+            return None
+        return [
+            dict(self.concepts[key], similarity_score=score, distance=1 - score)
+            for key, score in neighbors[:top_k]
+        ]
+
+    def save(self, path: str):
+        # Write-then-rename: serving processes may load the graph while it is rewritten
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"concepts": self.concepts, "neighbors": self.neighbors}, f)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> Optional["ConceptGraph"]:
+        try:
+            with open(path, "r") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"Could not load concept graph from {path}: {e}")
+            return None
+        return cls(data["concepts"], data["neighbors"])
+
+
+class ConceptGraphBuilder:
+    """Accumulates chunk embeddings into per-concept centroids"""
+
+    def __init__(self):
+        self.sums = {}  # lowercased title -> summed unit embedding
+        self.counts = {}
+        self.concepts = {}
+
+    def add(self, ids: List[str], documents: List[str], metadatas: List[Dict[str, Any]], embeddings):
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        if len(embeddings) == 0:
+            return
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        embeddings = embeddings / np.maximum(norms, 1e-12)
+
+        for doc_id, document, metadata, embedding in zip(ids, documents, metadatas, embeddings):
+            title = (metadata or {}).get('title')
+            if not title:
+                continue
+            key = title.strip().lower()
+            if key in self.sums:
+                self.sums[key] += embedding
+                self.counts[key] += 1
+            else:
+                self.sums[key] = embedding.copy()
+                self.counts[key] = 1
+            if key not in self.concepts or metadata.get('chunk_type') == 'main_concept':
+                self.concepts[key] = {'id': doc_id, 'content': document, 'metadata': metadata}
+
+    def build(self, top_n: int = CONCEPT_GRAPH_NEIGHBORS) -> ConceptGraph:
+        """All-pairs cosine similarity between concept centroids, keeping the top_n per concept"""
+        keys = list(self.sums)
+        if not keys:
+            return ConceptGraph({}, {})
+
+        centroids = np.stack([self.sums[key] / self.counts[key] for key in keys])
+        centroids /= np.maximum(np.linalg.norm(centroids, axis=1, keepdims=True), 1e-12)
+        similarities = centroids @ centroids.T
+        np.fill_diagonal(similarities, -np.inf)
+
+        k = min(top_n, len(keys) - 1)
+        neighbors = {}
+        for row, key in enumerate(keys):
+            if k <= 0:
+                neighbors[key] = []
+                continue
+            top = np.argpartition(-similarities[row], k - 1)[:k]
+            top = top[np.argsort(-similarities[row][top], kind='stable')]
+            neighbors[key] = [[keys[i], round(float(similarities[row][i]), 6)] for i in top]
+
+        return ConceptGraph(self.concepts, neighbors)
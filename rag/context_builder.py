@@ -0,0 +1,134 @@
+import os
+import re
+from collections import OrderedDict
+from typing import List, Dict, Any, Optional
+
+# Token budget for knowledge context inlined into LLM prompts
+RAG_CONTEXT_TOKEN_BUDGET = int(os.getenv('RAG_CONTEXT_TOKEN_BUDGET', '600'))
+
+CONTEXT_HEADER = "Relevant Financial Knowledge:"
+
+# Stop packing once less than this much budget is left
+MIN_USEFUL_TOKENS = 8
+
+_TOKEN_PATTERN = re.compile(r"[A-Za-z]+|\d+|[^\sA-Za-z\d]")
+_SENTENCE_SPLIT = re.compile(r"(?<=[.!?])\s+(?=[A-Z(])")
+_EMPTY_FIELD = re.compile(r"^\s*(Calculation|Parameters):\s*N/A\s*$", re.IGNORECASE)
+_REDUNDANT_FIELD = re.compile(r"^\s*(Title|Category):", re.IGNORECASE)
+
+
+def count_tokens(text: str) -> int:
+    """Estimate LLM tokens locally, without calling a tokenizer service.
+
+    Approximates BPE tokenizers (Llama/GPT style): every punctuation mark is a
+    token, numbers split into groups of three digits, and long words split
+    into roughly 6-character pieces. Errs slightly on the high side.
+    """
+    tokens = 0
+    for piece in _TOKEN_PATTERN.findall(text):
+        if piece.isalpha():
+            tokens += 1 + (len(piece) - 1) // 6
+        elif piece.isdigit():
+            tokens += 1 + (len(piece) - 1) // 3
+        else:
+            tokens += 1
+    return tokens
+
+
+def clean_chunk(content: str, title: str = "") -> List[str]:
+    """Strip formatting boilerplate from a stored chunk and return its lines.
+
+    Removes the indentation left by the ingestion templates, blank lines,
+    "N/A" fields, Title/Category lines (they go in the concept header) and the
+    repeated "<title> - " prefix on section headings.
+    """
+    lines = []
+    for line in content.splitlines():
+        line = line.strip()
+        if not line or _EMPTY_FIELD.match(line) or _REDUNDANT_FIELD.match(line):
+            continue
+        if title and line.startswith(f"{title} - "):
+            line = line[len(title) + 3:]
+        lines.append(line)
+    return lines
+
+
+def _normalize_unit(unit: str) -> str:
+    return re.sub(r"[\W_]+", " ", unit.lower()).strip()
+
+
+def build_context(results: List[Dict[str, Any]], max_tokens: int = RAG_CONTEXT_TOKEN_BUDGET,
+                  max_results: Optional[int] = None) -> str:
+    """Pack the most relevant search results into a token-bounded LLM context.
+
+    Results are taken in the order given, best first: the retrieval ranking
+    (e.g. fused vector/BM25 order) is kept. Chunks of the same concept are
+    grouped under one header, sentences already included (e.g. from an
+    overlapping chunk) are skipped, and packing works at sentence granularity
+    until the budget is spent.
+    """
+    if not results:
+        return ""
+
+    ranked = results[:max_results] if max_results else results
+
+    used = count_tokens(CONTEXT_HEADER)
+    seen_units = set()
+    concepts = OrderedDict()  # title -> {"header": str, "lines": [str]}
+    budget_exhausted = False
+
+    for result in ranked:
+        metadata = result.get('metadata') or {}
+        title = metadata.get('title', 'N/A')
+        category = metadata.get('category', 'N/A')
+
+        concept = concepts.get(title)
+        if concept is None:
+            header = f"## {title} ({category})"
+            header_cost = count_tokens(header)
+            if used + header_cost >= max_tokens:
+                break
+            concept = {"header": header, "header_cost": header_cost, "lines": []}
+
+        pending_heading = None
+        for line in clean_chunk(result['content'], title):
+            # Section headings ("Use Cases:") are only kept if content follows them
+            if line.endswith(':'):
+                pending_heading = line
+                continue
+
+            kept = []
+            for sentence in _SENTENCE_SPLIT.split(line):
+                key = _normalize_unit(sentence)
+                if not key or key in seen_units:
+                    continue
+                cost = count_tokens(sentence)
+                extra = concept["header_cost"] if title not in concepts else 0
+                if pending_heading:
+                    extra += count_tokens(pending_heading)
+                if used + extra + cost > max_tokens:
+                    # Too long for what is left; a shorter sentence may still fit
+                    budget_exhausted = max_tokens - used < MIN_USEFUL_TOKENS
+                    if budget_exhausted:
+                        break
+                    continue
+                if title not in concepts:
+                    concepts[title] = concept
+                if pending_heading:
+                    concept["lines"].append(pending_heading)
+                    pending_heading = None
+                seen_units.add(key)
+                kept.append(sentence)
+                used += extra + cost
+            if kept:
+                concept["lines"].append(" ".join(kept))
+            if budget_exhausted:
+                break
+
+        if budget_exhausted:
+            break
+
+    sections = [f"{c['header']}\n" + "\n".join(c['lines']) for c in concepts.values() if c['lines']]
+    if not sections:
+        return ""
+    return f"{CONTEXT_HEADER}\n\n" + "\n\n".join(sections) + "\n"
@@ -0,0 +1,208 @@
+import os
+import re
+import fcntl
+import hashlib
+import threading
+from contextlib import contextmanager
+from typing import Callable, List, Optional
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_CACHE_DIR = os.getenv('EMBEDDING_CACHE_DIR', os.path.join("rag", "embedding_cache"))
+
+
+class EmbeddingCache:
+    """Persistent chunk-embedding cache keyed by content hash, one per model.
+
+    Vectors are appended as raw float32 rows to "<model>.f32" and read back
+    through a read-only memory map; "<model>.keys" holds one content hash per
+    row. Vectors are written before their keys, so an interrupted write never
+    leaves a key pointing at a missing row. Ingestion and serving processes
+    share the files, so loading and appending hold an exclusive lock on
+    "<model>.lock".
+    """
+
+    def __init__(self, model_name: str, cache_dir: str = EMBEDDING_CACHE_DIR):
+        self.model_name = model_name
+        self.cache_dir = cache_dir
+        slug = re.sub(r'[^A-Za-z0-9_.-]+', '_', model_name)
+        self.keys_path = os.path.join(cache_dir, f"{slug}.keys")
+        self.vectors_path = os.path.join(cache_dir, f"{slug}.f32")
+        self.lock_path = os.path.join(cache_dir, f"{slug}.lock")
+
+        self.dim = None
+        self._index = {}  # content hash -> row
+        self._rows = 0
+        self._vectors = None
+        self._keys_state = None  # (inode, size) of the keys file as last read or written
+        self._lock = threading.Lock()
+        if os.path.isdir(cache_dir):
+            with self._file_lock():
+                self._load()
+            logger.info(f"Loaded embedding cache with {len(self._index)} vectors from {self.vectors_path}")
+
+    def content_key(self, text: str) -> str:
+        return hashlib.sha256(f"{self.model_name}\0{text}".encode('utf-8')).hexdigest()
+
+    @contextmanager
+    def _file_lock(self):
+        """Exclusive lock shared by every process using this cache"""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        with open(self.lock_path, "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _reset_files(self):
+        for path in (self.keys_path, self.vectors_path):
+            if os.path.exists(path):
+                os.remove(path)
+        self.dim = None
+
+    def _load(self):
+        """Read the cache from disk (call with the file lock held).
+
+        Both files are cut back to the rows they agree on, so a later append
+        always starts right after the last trusted row. If no row is usable
+        (a file is missing, the header is bad, or no vector is complete) both
+        files are removed and the next append starts a fresh cache.
+        """
+        self._index = {}
+        self._rows = 0
+        self._vectors = None
+        self._keys_state = None
+
+        keys = []
+        header = b""
+        if os.path.exists(self.keys_path):
+            with open(self.keys_path, "rb") as f:
+                header = f.readline()
+                keys = f.read().decode("ascii").split("\n")
+            keys.pop()  # "" after the last newline, or a key whose write was cut short
+
+        if not header.startswith(b"dim=") or not header.endswith(b"\n"):
+            if header:
+                logger.warning(f"Discarding embedding cache with bad header: {self.keys_path}")
+            self._reset_files()
+            return
+        self.dim = int(header[4:])
+
+        # Trust only rows present in both files
+        vector_rows = os.path.getsize(self.vectors_path) // (4 * self.dim) if os.path.exists(self.vectors_path) else 0
+        rows = min(len(keys), vector_rows)
+        if rows == 0:
+            if keys or vector_rows:
+                logger.warning(f"Discarding embedding cache without usable rows: {self.keys_path}")
+            self._reset_files()
+            return
+        if len(header) + 65 * rows != os.path.getsize(self.keys_path):
+            with open(self.keys_path, "w") as f:
+                f.write(f"dim={self.dim}\n" + "".join(f"{key}\n" for key in keys[:rows]))
+        if os.path.getsize(self.vectors_path) != rows * 4 * self.dim:
+            os.truncate(self.vectors_path, rows * 4 * self.dim)
+
+        self._index = {key: row for row, key in enumerate(keys[:rows])}
+        self._rows = rows
+        self._remember_keys_file()
+        self._vectors = np.memmap(self.vectors_path, dtype=np.float32, mode='r', shape=(rows, self.dim))
+        logger.debug(f"Loaded embedding cache with {rows} vectors from {self.vectors_path}")
+
+    def _remember_keys_file(self):
+        stat = os.stat(self.keys_path)
+        self._keys_state = (stat.st_ino, stat.st_size)
+
+    def _catch_up(self):
+        """Index rows other processes appended since the last read (call with the file lock held).
+
+        Only the new tail of the keys file is read. Anything other than a
+        clean append (files replaced, truncated, or a partial last row) falls
+        back to a full _load.
+        """
+        try:
+            stat = os.stat(self.keys_path)
+        except FileNotFoundError:
+            stat = None
+        if (self._keys_state is None or stat is None or stat.st_ino != self._keys_state[0]
+                or stat.st_size < self._keys_state[1] or not os.path.exists(self.vectors_path)):
+            self._load()
+            return
+        if stat.st_size > self._keys_state[1]:
+            with open(self.keys_path, "rb") as f:
+                f.seek(self._keys_state[1])
+                tail = f.read(stat.st_size - self._keys_state[1]).decode("ascii")
+            new_keys = tail.split("\n")
+            vector_rows = os.path.getsize(self.vectors_path) // (4 * self.dim)
+            if new_keys.pop() or self._rows + len(new_keys) > vector_rows:
+                self._load()
+                return
+            for offset, key in enumerate(new_keys):
+                self._index[key] = self._rows + offset
+            self._rows += len(new_keys)
+            self._keys_state = (stat.st_ino, stat.st_size)
+        # Vectors past the last key belong to an append that was cut short
+        if os.path.getsize(self.vectors_path) > self._rows * 4 * self.dim:
+            os.truncate(self.vectors_path, self._rows * 4 * self.dim)
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def get(self, text: str) -> Optional[np.ndarray]:
+        row = self._index.get(self.content_key(text))
+        return None if row is None else np.array(self._vectors[row])
+
+    def put_many(self, texts: List[str], vectors: np.ndarray):
+        """Append vectors for texts that are not cached yet"""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        with self._lock, self._file_lock():
+            # Pick up rows other processes appended since the last read
+            self._catch_up()
+            if self.dim is None:
+                self.dim = vectors.shape[1]
+            elif vectors.shape[1] != self.dim:
+                raise ValueError(f"Embedding dim {vectors.shape[1]} does not match cache dim {self.dim}")
+
+            new_rows = {}
+            for text, vector in zip(texts, vectors):
+                key = self.content_key(text)
+                if key not in self._index and key not in new_rows:
+                    new_rows[key] = vector
+            if not new_rows:
+                return
+
+            if not self._rows:
+                # _load removed any unusable files: start both from scratch
+                with open(self.keys_path, "w") as f:
+                    f.write(f"dim={self.dim}\n")
+
+            with open(self.vectors_path, "ab") as f:
+                f.write(np.stack(list(new_rows.values())).astype(np.float32).tobytes())
+            with open(self.keys_path, "a") as f:
+                f.write("".join(f"{key}\n" for key in new_rows))
+            self._remember_keys_file()
+
+            for offset, key in enumerate(new_rows):
+                self._index[key] = self._rows + offset
+            self._rows += len(new_rows)
+            self._vectors = np.memmap(self.vectors_path, dtype=np.float32, mode='r', shape=(self._rows, self.dim))
+
+    def encode(self, texts: List[str], encode_fn: Callable[[List[str]], np.ndarray]) -> np.ndarray:
+        """Return embeddings for texts, running encode_fn once per distinct cache miss"""
+        cached = [self.get(text) for text in texts]
+        missing = list(dict.fromkeys(text for text, vector in zip(texts, cached) if vector is None))
+        logger.info(f"Embedding cache: {sum(vector is not None for vector in cached)} hits, "
+                    f"{len(missing)} distinct misses")
+
+        if missing:
+            fresh = np.asarray(encode_fn(missing), dtype=np.float32)
+            self.put_many(missing, fresh)
+            by_text = dict(zip(missing, fresh))
+            cached = [by_text[text] if vector is None else vector for text, vector in zip(texts, cached)]
+
+        if not cached:
+            return np.zeros((0, self.dim or 0), dtype=np.float32)
+        return np.stack(cached).astype(np.float32, copy=False)
@@ -0,0 +1,329 @@
+"""Embedding sidecar: one model process serving every app worker over a Unix socket.
+
+Concurrent encode requests are merged into dynamic batches. A batch is
+closed when it holds max_batch texts or when the oldest request has waited
+max_wait_ms, so throughput grows with load while an idle request pays at
+most the deadline.
+
+Wire format (both directions): 4-byte big-endian length + JSON header.
+Requests are {"texts": [...]} or {"op": "info"}; an encode reply header
+{"rows": n, "dim": d} is followed by n*d float32 values (little-endian).
+Errors are returned as {"error": "..."}.
+
+Usage:
+    python -m rag.embedding_server [--socket PATH] [--max-batch 64] [--max-wait-ms 5]
+and point the app at it with EMBEDDING_SIDECAR_SOCKET=PATH.
+"""
+import argparse
+import errno
+import json
+import os
+import queue
+import socket
+import socketserver
+import struct
+import sys
+import threading
+import time
+from typing import List, Optional, Tuple
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_SIDECAR_SOCKET = os.getenv('EMBEDDING_SIDECAR_SOCKET', '')
+EMBEDDING_SIDECAR_MAX_BATCH = int(os.getenv('EMBEDDING_SIDECAR_MAX_BATCH', '64'))
+EMBEDDING_SIDECAR_MAX_WAIT_MS = float(os.getenv('EMBEDDING_SIDECAR_MAX_WAIT_MS', '5'))
+EMBEDDING_SIDECAR_TIMEOUT = float(os.getenv('EMBEDDING_SIDECAR_TIMEOUT', '30'))
+
+DEFAULT_SOCKET_PATH = "/tmp/financial-chatbot-embeddings.sock"
+
+_HEADER = struct.Struct(">I")
+
+
+def _recv_exact(sock: socket.socket, size: int) -> bytes:
+    buffer = bytearray()
+    while len(buffer) < size:
+        chunk = sock.recv(size - len(buffer))
+        if not chunk:
+            raise ConnectionError("embedding socket closed")
+        buffer.extend(chunk)
+    return bytes(buffer)
+
+
+def send_message(sock: socket.socket, header: dict, payload: bytes = b""):
+    data = json.dumps(header).encode("utf-8")
+    sock.sendall(_HEADER.pack(len(data)) + data + payload)
+
+
+def recv_header(sock: socket.socket) -> dict:
+    (size,) = _HEADER.unpack(_recv_exact(sock, _HEADER.size))
+    return json.loads(_recv_exact(sock, size).decode("utf-8"))
+
+
+class _Request:
+    __slots__ = ("texts", "done", "result", "error")
+
+    def __init__(self, texts: List[str]):
+        self.texts = texts
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class DynamicBatcher:
+    """Merges concurrent encode calls into batches for one encoder thread"""
+
+    def __init__(self, encode_fn, max_batch: int = EMBEDDING_SIDECAR_MAX_BATCH,
+                 max_wait_ms: float = EMBEDDING_SIDECAR_MAX_WAIT_MS):
+        self.encode_fn = encode_fn
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue = queue.Queue()
+        self.batches = 0
+        self.texts = 0
+        self._thread = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+        self._thread.start()
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        request = _Request(texts)
+        self._queue.put(request)
+        request.done.wait()
+        if request.error is not None:
+            raise request.error
+        return request.result
+
+    def _collect(self) -> List[_Request]:
+        batch = [self._queue.get()]
+        size = len(batch[0].texts)
+        deadline = time.monotonic() + self.max_wait
+        while size < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                request = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            batch.append(request)
+            size += len(request.texts)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            texts = [text for request in batch for text in request.texts]
+            try:
+                vectors = np.asarray(self.encode_fn(texts), dtype=np.float32)
+            except Exception as e:
+                for request in batch:
+                    request.error = e
+                    request.done.set()
+                continue
+
+            self.batches += 1
+            self.texts += len(texts)
+            start = 0
+            for request in batch:
+                request.result = vectors[start:start + len(request.texts)]
+                start += len(request.texts)
+                request.done.set()
+
+    def stats(self):
+        return {"batches": self.batches, "texts": self.texts,
+                "mean_batch": self.texts / self.batches if self.batches else 0.0}
+
+
+class EmbeddingRequestHandler(socketserver.BaseRequestHandler):
+    """Serves requests on one persistent client connection"""
+
+    def handle(self):
+        server = self.server
+        while True:
+            try:
+                request = recv_header(self.request)
+            except (ConnectionError, OSError):
+                return
+
+            try:
+                if request.get("op") == "info":
+                    send_message(self.request, {"model_id": server.model_id, "dim": server.dim,
+                                                **server.batcher.stats()})
+                    continue
+                vectors = server.batcher.encode(list(request["texts"]))
+                vectors = np.ascontiguousarray(vectors, dtype="<f4")
+                rows, dim = vectors.shape if vectors.ndim == 2 else (0, server.dim)
+                send_message(self.request, {"rows": rows, "dim": dim}, vectors.tobytes())
+            except (ConnectionError, OSError):
+                return
+            except Exception as e:
+                logger.error(f"Embedding request failed: {e}")
+                send_message(self.request, {"error": str(e)})
+
+
+class EmbeddingServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+    request_queue_size = 128  # every worker thread may connect at once
+
+    def __init__(self, socket_path: str, service, batcher: DynamicBatcher):
+        self.model_id = service.model_id
+        self.dim = service.dimension
+        self.batcher = batcher
+        _remove_stale_socket(socket_path)
+        super().__init__(socket_path, EmbeddingRequestHandler)
+        os.chmod(socket_path, 0o660)
+        self.socket_inode = os.stat(socket_path).st_ino
+
+    def remove_socket(self):
+        """Unlink the socket file, unless another server has since replaced it"""
+        try:
+            if os.stat(self.server_address).st_ino == self.socket_inode:
+                os.remove(self.server_address)
+        except FileNotFoundError:
+            pass
+
+
+def _remove_stale_socket(socket_path: str):
+    """Unlink a socket file left behind by a sidecar that exited.
+
+    Raises OSError(EADDRINUSE) if a sidecar is still accepting connections
+    on it: removing its socket would leave that process unreachable.
+    """
+    if not os.path.exists(socket_path):
+        return
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+        try:
+            probe.connect(socket_path)
+        except (ConnectionRefusedError, FileNotFoundError):
+            pass
+        else:
+            raise OSError(errno.EADDRINUSE, f"An embedding sidecar is already serving on {socket_path}")
+    try:
+        os.remove(socket_path)
+    except FileNotFoundError:
+        pass
+
+
+class EmbeddingSidecarMismatch(RuntimeError):
+    """The sidecar serves a different embedding model than the client expects"""
+
+
+class SidecarEmbeddingClient:
+    """Client for the embedding sidecar, with one persistent connection per thread.
+
+    Every new connection first asks the sidecar for its model id and
+    dimension and refuses to use it (EmbeddingSidecarMismatch) if they differ
+    from expected_model_id / expected_dim: vectors from another model would
+    silently search a different embedding space.
+    """
+
+    def __init__(self, socket_path: str, timeout: float = EMBEDDING_SIDECAR_TIMEOUT,
+                 expected_model_id: Optional[str] = None, expected_dim: Optional[int] = None):
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self.expected_model_id = expected_model_id
+        self.expected_dim = expected_dim
+        self._local = threading.local()
+
+    def _connection(self) -> socket.socket:
+        sock = getattr(self._local, "sock", None)
+        if sock is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                # Blocking connect: with a timeout set, a full listen backlog fails with EAGAIN instead of waiting
+                sock.connect(self.socket_path)
+                sock.settimeout(self.timeout)
+                send_message(sock, {"op": "info"})
+                self._check_info(recv_header(sock))
+            except BaseException:
+                sock.close()
+                raise
+            self._local.sock = sock
+        return sock
+
+    def _check_info(self, info: dict):
+        if self.expected_model_id is not None and info.get("model_id") != self.expected_model_id:
+            raise EmbeddingSidecarMismatch(f"Embedding sidecar serves {info.get('model_id')}, "
+                                           f"expected {self.expected_model_id}")
+        if self.expected_dim is not None and info.get("dim") != self.expected_dim:
+            raise EmbeddingSidecarMismatch(f"Embedding sidecar returns {info.get('dim')}-dim vectors, "
+                                           f"expected {self.expected_dim}")
+
+    def _close(self):
+        sock = getattr(self._local, "sock", None)
+        if sock is not None:
+            sock.close()
+            self._local.sock = None
+
+    def _call(self, header: dict) -> Tuple[dict, socket.socket]:
+        # A failed send on a kept-alive connection (the sidecar restarted) is
+        # retried once on a fresh one: the sidecar only acts on complete
+        # messages. Once the request is sent it is never re-sent, since a
+        # timeout or reset may come after the sidecar already took it.
+        for attempt in range(2):
+            sock = self._connection()
+            try:
+                send_message(sock, header)
+            except OSError:
+                self._close()
+                if attempt:
+                    raise
+                continue
+            try:
+                return recv_header(sock), sock
+            except OSError:
+                self._close()
+                raise
+
+    def info(self) -> dict:
+        return self._call({"op": "info"})[0]
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        reply, sock = self._call({"texts": list(texts)})
+        if "error" in reply:
+            raise RuntimeError(f"Embedding sidecar error: {reply['error']}")
+        try:
+            data = _recv_exact(sock, reply["rows"] * reply["dim"] * 4)
+        except (ConnectionError, OSError):
+            self._close()
+            raise
+        return np.frombuffer(data, dtype="<f4").reshape(reply["rows"], reply["dim"]).astype(np.float32)
+
+
+def main():
+    from rag.embeddings import EmbeddingService
+
+    parser = argparse.ArgumentParser(description="Serve batched sentence embeddings over a Unix socket")
+    parser.add_argument("--socket", default=EMBEDDING_SIDECAR_SOCKET or DEFAULT_SOCKET_PATH)
+    parser.add_argument("--max-batch", type=int, default=EMBEDDING_SIDECAR_MAX_BATCH)
+    parser.add_argument("--max-wait-ms", type=float, default=EMBEDDING_SIDECAR_MAX_WAIT_MS)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    # The sidecar itself always encodes in-process
+    service = EmbeddingService(sidecar_socket="")
+    service.encode(["warm up"])
+    batcher = DynamicBatcher(service.encode, args.max_batch, args.max_wait_ms)
+
+    try:
+        server = EmbeddingServer(args.socket, service, batcher)
+    except OSError as e:
+        if e.errno != errno.EADDRINUSE:
+            raise
+        logger.error(e.strerror)
+        sys.exit(1)
+    
+    with server:
+        logger.info(f"Serving {service.model_id} embeddings on {args.socket} "
+                    f"(max batch {args.max_batch}, max wait {args.max_wait_ms}ms)")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.remove_socket()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+import os
+import importlib.util
+import threading
+from typing import List, Optional
+import logging
+
+import numpy as np
+
+from rag.embedding_server import SidecarEmbeddingClient, EMBEDDING_SIDECAR_SOCKET
+from rag.ingestion_state import load_collection_manifest
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_MODEL_NAME = os.getenv('EMBEDDING_MODEL', 'all-MiniLM-L6-v2')
+EMBEDDING_DEVICE = os.getenv('EMBEDDING_DEVICE', 'cpu')
+EMBEDDING_THREADS = int(os.getenv('EMBEDDING_THREADS', '0'))  # 0 keeps the torch default
+EMBEDDING_BATCH_SIZE = int(os.getenv('EMBEDDING_BATCH_SIZE', '32'))
+# Inference backend: "torch" (float32 SentenceTransformer) or "onnx-int8" (quantized ONNX Runtime)
+EMBEDDING_BACKEND = os.getenv('EMBEDDING_BACKEND', 'torch').lower()
+EMBEDDING_BACKENDS = ("torch", "onnx-int8")
+# Load the model locally when the sidecar is unreachable (off: every worker would hold a copy)
+EMBEDDING_SIDECAR_FALLBACK = os.getenv('EMBEDDING_SIDECAR_FALLBACK', 'false').lower() == 'true'
+
+
+class EmbeddingService:
+    """Process-wide sentence embedding model shared by ingestion and retrieval.
+
+    The model is loaded lazily on first use, and encode calls are serialized
+    so concurrent request threads don't oversubscribe the CPU with competing
+    thread pools. With backend="onnx-int8" the model runs on ONNX Runtime
+    with int8 weights (see rag.onnx_embedder), falling back to torch when
+    onnxruntime is not installed. With a sidecar_socket, encoding is sent to
+    the batching embedding sidecar (rag.embedding_server), which must serve
+    the same model_id (and the dimension recorded in the collection
+    manifest). If it can't be reached, the error is raised unless
+    sidecar_fallback allows loading the model locally.
+    """
+
+    def __init__(self, model_name: str = EMBEDDING_MODEL_NAME, device: str = EMBEDDING_DEVICE,
+                 num_threads: int = EMBEDDING_THREADS, batch_size: int = EMBEDDING_BATCH_SIZE,
+                 backend: str = EMBEDDING_BACKEND, sidecar_socket: str = EMBEDDING_SIDECAR_SOCKET,
+                 sidecar_fallback: bool = EMBEDDING_SIDECAR_FALLBACK):
+        self.model_name = model_name
+        self.device = device
+        self.num_threads = num_threads
+        self.batch_size = batch_size
+        
+        if backend not in EMBEDDING_BACKENDS:
+            logger.warning(f"Unknown EMBEDDING_BACKEND '{backend}', using torch")
+            backend = "torch"
+        if backend == "onnx-int8" and importlib.util.find_spec("onnxruntime") is None:
+            logger.warning("onnxruntime is not installed, using the torch embedding backend")
+            backend = "torch"
+        self.backend = backend
+        self.sidecar = None
+        self.sidecar_fallback = sidecar_fallback
+        if sidecar_socket:
+            manifest = load_collection_manifest() or {}
+            expected_dim = manifest.get("embedding_dim") if manifest.get("embedding_model") == self.model_id else None
+            self.sidecar = SidecarEmbeddingClient(sidecar_socket, expected_model_id=self.model_id,
+                                                  expected_dim=expected_dim)
+
+        self._model = None
+        self._load_lock = threading.Lock()
+        self._encode_lock = threading.Lock()
+
+    @property
+    def model(self):
+        """The underlying SentenceTransformer, loaded on first access"""
+        if self._model is None:
+            with self._load_lock:
+                if self._model is None:
+                    self._model = self._load_model()
+        return self._model
+
+    @property
+    def is_loaded(self) -> bool:
+        return self._model is not None
+
+    @property
+    def model_id(self) -> str:
+        """Model name qualified by backend; quantized vectors differ slightly from float ones"""
+        return self.model_name if self.backend == "torch" else f"{self.model_name}@{self.backend}"
+
+    def _load_model(self):
+        if self.backend == "onnx-int8":
+            from rag.onnx_embedder import OnnxSentenceEncoder
+            return OnnxSentenceEncoder(self.model_name, num_threads=self.num_threads)
+        
+        from sentence_transformers import SentenceTransformer
+
+        if self.num_threads > 0:
+            import torch
+            torch.set_num_threads(self.num_threads)
+
+        logger.info(f"Loading embedding model {self.model_name} on {self.device}")
+        return SentenceTransformer(self.model_name, device=self.device)
+
+    @property
+    def dimension(self) -> int:
+        if self.sidecar is not None and not self.is_loaded:
+            try:
+                return self.sidecar.info()["dim"]
+            except OSError as e:
+                if not self.sidecar_fallback:
+                    raise
+                logger.warning(f"Embedding sidecar unavailable ({e}), loading the model locally")
+        return self.model.get_sentence_embedding_dimension()
+
+    def encode(self, texts: List[str], batch_size: Optional[int] = None,
+               show_progress_bar: bool = False) -> np.ndarray:
+        """Embed a list of texts; returns a float32 array of shape (len(texts), dim)"""
+        if self.sidecar is not None:
+            try:
+                return self.sidecar.encode(texts)
+            except OSError as e:
+                if not self.sidecar_fallback:
+                    raise
+                logger.warning(f"Embedding sidecar unavailable ({e}), encoding locally")
+        
+        model = self.model
+        with self._encode_lock:
+            embeddings = model.encode(
+                texts,
+                batch_size=batch_size or self.batch_size,
+                show_progress_bar=show_progress_bar,
+                convert_to_numpy=True
+            )
+        return np.asarray(embeddings, dtype=np.float32)
+
+
+# Global instance for easy access
+_embedding_service = None
+_embedding_service_lock = threading.Lock()
+
+def get_embedding_service() -> EmbeddingService:
+    """Get global embedding service instance"""
+    global _embedding_service
+    if _embedding_service is None:
+        with _embedding_service_lock:
+            if _embedding_service is None:
+                _embedding_service = EmbeddingService()
+    return _embedding_service
@@ -0,0 +1,145 @@
+import fcntl
+import hashlib
+import json
+import os
+from contextlib import contextmanager
+from typing import List, Dict, Any, Optional
+import logging
+
+from rag.bm25 import BM25_INDEX_FILE
+from rag.concept_graph import CONCEPT_GRAPH_FILE
+
+logger = logging.getLogger(__name__)
+
+# Knowledge base source files, in ingestion order
+KNOWLEDGE_FILES = [
+    "technical_strategies.json",
+    "investment_styles.json",
+    "risk_management.json"
+]
+
+INGESTION_METADATA_FILE = "ingestion_metadata.json"
+COLLECTION_MANIFEST_FILE = "collection_manifest.json"
+INGESTION_LOCK_FILE = "ingestion.lock"
+
+# Written at the end of every successful ingestion
+INGESTION_ARTIFACTS = (BM25_INDEX_FILE, CONCEPT_GRAPH_FILE, COLLECTION_MANIFEST_FILE)
+
+
+def file_md5(filepath: str) -> str:
+    """Calculate MD5 hash of a file ("" if it doesn't exist)"""
+    hash_md5 = hashlib.md5()
+    try:
+        with open(filepath, "rb") as f:
+            for chunk in iter(lambda: f.read(4096), b""):
+                hash_md5.update(chunk)
+        return hash_md5.hexdigest()
+    except FileNotFoundError:
+        return ""
+
+
+def file_fingerprint(filepath: str) -> Dict[str, Any]:
+    stat = os.stat(filepath)
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "md5": file_md5(filepath)}
+
+
+def load_ingestion_state(rag_folder: str = "rag") -> Dict[str, Dict[str, Any]]:
+    """Stored fingerprints per knowledge file.
+
+    Older metadata files map each file straight to its MD5; those entries
+    are returned as {"md5": ...} so they still compare by content.
+    """
+    try:
+        with open(os.path.join(rag_folder, INGESTION_METADATA_FILE), "r") as f:
+            state = json.load(f)
+    except FileNotFoundError:
+        return {}
+    return {name: entry if isinstance(entry, dict) else {"md5": entry} for name, entry in state.items()}
+
+
+def save_ingestion_state(rag_folder: str = "rag", files: List[str] = KNOWLEDGE_FILES):
+    """Record the fingerprints of the knowledge files that were just ingested"""
+    state = {}
+    for json_file in files:
+        filepath = os.path.join(rag_folder, json_file)
+        if os.path.exists(filepath):
+            state[json_file] = file_fingerprint(filepath)
+
+    os.makedirs(rag_folder, exist_ok=True)
+    with open(os.path.join(rag_folder, INGESTION_METADATA_FILE), "w") as f:
+        json.dump(state, f, indent=2)
+
+
+def file_changed(filepath: str, stored: Optional[Dict[str, Any]]) -> bool:
+    """Compare a file with its stored fingerprint, hashing only if size or mtime differ"""
+    if not stored:
+        return True
+    stat = os.stat(filepath)
+    if stored.get("size") == stat.st_size and stored.get("mtime_ns") == stat.st_mtime_ns:
+        return False
+    # Touched or copied but possibly identical: decide by content
+    return file_md5(filepath) != stored.get("md5")
+
+
+def load_collection_manifest(rag_folder: str = "rag") -> Optional[Dict[str, Any]]:
+    """Collection statistics written by the last ingestion (None if missing or unreadable)"""
+    try:
+        with open(os.path.join(rag_folder, COLLECTION_MANIFEST_FILE), "r") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logger.warning(f"Could not load collection manifest: {e}")
+        return None
+
+
+def needs_ingestion(rag_folder: str = "rag", files: List[str] = KNOWLEDGE_FILES,
+                    embedding_model_id: Optional[str] = None) -> bool:
+    """Decide whether the knowledge base must be (re)ingested.
+
+    Only stats and small JSON files are read: the vector store and the
+    embedding model are never opened, so this is cheap enough for startup.
+    """
+    state = load_ingestion_state(rag_folder)
+    for json_file in files:
+        filepath = os.path.join(rag_folder, json_file)
+        if not os.path.exists(filepath):
+            continue
+        if file_changed(filepath, state.get(json_file)):
+            logger.info(f"File {json_file} has changed or is new. Ingestion needed.")
+            return True
+
+    if not os.path.isdir(os.path.join(rag_folder, "chroma_db")):
+        logger.info("Vector store is missing. Ingestion needed.")
+        return True
+
+    for artifact in INGESTION_ARTIFACTS:
+        if not os.path.exists(os.path.join(rag_folder, artifact)):
+            logger.info(f"{artifact} is missing. Ingestion needed.")
+            return True
+
+    manifest = load_collection_manifest(rag_folder) or {}
+    if not manifest.get("total_documents"):
+        logger.info("Collection is empty. Ingestion needed.")
+        return True
+    if embedding_model_id is not None and manifest.get("embedding_model") != embedding_model_id:
+        logger.info("Embedding model or backend changed. Ingestion needed.")
+        return True
+
+    return False
+
+
+@contextmanager
+def ingestion_lock(rag_folder: str = "rag"):
+    """Exclusive cross-process lock held while the knowledge base is (re)ingested.
+
+    Only one process may write the Chroma directory, the embedding cache and
+    the index files at a time; others block here until it has finished.
+    """
+    os.makedirs(rag_folder, exist_ok=True)
+    with open(os.path.join(rag_folder, INGESTION_LOCK_FILE), "a") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
@@ -0,0 +1,156 @@
+import json
+import os
+import re
+import fcntl
+import shutil
+import tempfile
+from typing import List, Optional
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+ONNX_MODEL_DIR = os.getenv('EMBEDDING_ONNX_DIR', os.path.join("rag", "onnx_models"))
+
+
+class OnnxSentenceEncoder:
+    """Sentence-transformer inference on ONNX Runtime with int8 weights.
+
+    On first use the PyTorch model is exported to ONNX and dynamically
+    quantized (int8 weights, float activations); later loads only need
+    onnxruntime and the fast tokenizer. Exports are serialized across
+    processes with a file lock and published with os.replace, so concurrent
+    workers never load a half-written model. Pooling and normalization
+    follow the sentence-transformers pipeline, so encode() is a drop-in
+    replacement for SentenceTransformer.encode.
+    """
+
+    def __init__(self, model_name: str, model_dir: str = ONNX_MODEL_DIR, num_threads: int = 0):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        self.model_name = model_name
+        self.export_dir = os.path.join(model_dir, re.sub(r'[^A-Za-z0-9_.-]+', '_', model_name))
+        self.fp32_path = os.path.join(self.export_dir, "model.onnx")
+        self.int8_path = os.path.join(self.export_dir, "model-int8.onnx")
+        self.config_path = os.path.join(self.export_dir, "pooling.json")
+        self.tokenizer_path = os.path.join(self.export_dir, "tokenizer.json")
+
+        if not self.is_exported():
+            self.export()
+
+        with open(self.config_path, "r") as f:
+            self.config = json.load(f)
+
+        self.tokenizer = Tokenizer.from_file(self.tokenizer_path)
+        self.tokenizer.enable_truncation(max_length=self.config["max_seq_length"])
+        self.tokenizer.enable_padding(pad_id=self.config["pad_token_id"], pad_token=self.config["pad_token"])
+
+        options = ort.SessionOptions()
+        if num_threads > 0:
+            options.intra_op_num_threads = num_threads
+        self.session = ort.InferenceSession(self.int8_path, options, providers=["CPUExecutionProvider"])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+        logger.info(f"Loaded int8 ONNX embedding model from {self.int8_path}")
+
+    def is_exported(self) -> bool:
+        # pooling.json is published last, so its presence means the export is complete
+        return all(os.path.exists(path) for path in (self.int8_path, self.tokenizer_path, self.config_path))
+
+    def export(self):
+        """Export the PyTorch model to ONNX and quantize it to int8, once across processes"""
+        os.makedirs(self.export_dir, exist_ok=True)
+        with open(f"{self.export_dir}.lock", "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                # Another process may have finished the export while we waited
+                if self.is_exported():
+                    return
+                staging_dir = tempfile.mkdtemp(prefix=".export-", dir=self.export_dir)
+                try:
+                    self._export_to(staging_dir)
+                    for name in ("model.onnx", "model-int8.onnx", "tokenizer.json", "pooling.json"):
+                        os.replace(os.path.join(staging_dir, name), os.path.join(self.export_dir, name))
+                finally:
+                    shutil.rmtree(staging_dir, ignore_errors=True)
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _export_to(self, output_dir: str):
+        import torch
+        from onnxruntime.quantization import quantize_dynamic, QuantType
+        from sentence_transformers import SentenceTransformer
+        from sentence_transformers.models import Normalize
+
+        logger.info(f"Exporting {self.model_name} to ONNX in {self.export_dir}")
+        fp32_path = os.path.join(output_dir, "model.onnx")
+        st_model = SentenceTransformer(self.model_name, device="cpu")
+        transformer = st_model[0].auto_model.eval()
+        tokenizer = st_model.tokenizer
+
+        class HiddenStates(torch.nn.Module):
+            def __init__(self, model):
+                super().__init__()
+                self.model = model
+
+            def forward(self, input_ids, attention_mask, token_type_ids):
+                return self.model(input_ids=input_ids, attention_mask=attention_mask,
+                                  token_type_ids=token_type_ids)[0]
+
+        sample = tokenizer(["export sample sentence"], return_tensors="pt")
+        token_type_ids = sample.get("token_type_ids", torch.zeros_like(sample["input_ids"]))
+        dynamic = {0: "batch", 1: "sequence"}
+        with torch.no_grad():
+            torch.onnx.export(
+                HiddenStates(transformer),
+                (sample["input_ids"], sample["attention_mask"], token_type_ids),
+                fp32_path,
+                input_names=["input_ids", "attention_mask", "token_type_ids"],
+                output_names=["last_hidden_state"],
+                dynamic_axes={"input_ids": dynamic, "attention_mask": dynamic,
+                              "token_type_ids": dynamic, "last_hidden_state": dynamic},
+                opset_version=14
+            )
+        quantize_dynamic(fp32_path, os.path.join(output_dir, "model-int8.onnx"), weight_type=QuantType.QInt8)
+
+        tokenizer.backend_tokenizer.save(os.path.join(output_dir, "tokenizer.json"))
+        with open(os.path.join(output_dir, "pooling.json"), "w") as f:
+            json.dump({
+                "max_seq_length": st_model.max_seq_length,
+                "dimension": st_model.get_sentence_embedding_dimension(),
+                "normalize": any(isinstance(module, Normalize) for module in st_model),
+                "pad_token": tokenizer.pad_token,
+                "pad_token_id": tokenizer.pad_token_id
+            }, f, indent=2)
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.config["dimension"]
+
+    def encode(self, texts: List[str], batch_size: int = 32, show_progress_bar: bool = False,
+               convert_to_numpy: bool = True, normalize_embeddings: Optional[bool] = None) -> np.ndarray:
+        if isinstance(texts, str):
+            texts = [texts]
+        normalize = self.config["normalize"] if normalize_embeddings is None else normalize_embeddings
+
+        batches = []
+        for start in range(0, len(texts), batch_size):
+            encodings = self.tokenizer.encode_batch(texts[start:start + batch_size])
+            attention_mask = np.array([e.attention_mask for e in encodings], dtype=np.int64)
+            feeds = {
+                "input_ids": np.array([e.ids for e in encodings], dtype=np.int64),
+                "attention_mask": attention_mask,
+                "token_type_ids": np.array([e.type_ids for e in encodings], dtype=np.int64)
+            }
+            hidden = self.session.run(None, {k: v for k, v in feeds.items() if k in self.input_names})[0]
+
+            # Mean pooling over real (unpadded) tokens
+            mask = attention_mask[:, :, None].astype(np.float32)
+            embeddings = (hidden * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9)
+            if normalize:
+                embeddings /= np.maximum(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12)
+            batches.append(embeddings.astype(np.float32))
+
+        if not batches:
+            return np.zeros((0, self.get_sentence_embedding_dimension()), dtype=np.float32)
+        return np.concatenate(batches)
@@ -1,80 +1,92 @@
+import argparse
 import json
 import os
 import hashlib
-import chromadb
-from sentence_transformers import SentenceTransformer
-from typing import List, Dict, Any
+import multiprocessing
+import time
+from collections import Counter, deque
+from datetime import datetime, timezone
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Dict, Any, Iterator, Optional, Tuple
 import logging
+from rag.answer_cache import invalidate_answer_cache
+from rag.bm25 import BM25Builder, BM25_INDEX_FILE
+from rag.embeddings import get_embedding_service
+from rag.embedding_cache import EmbeddingCache
+from rag.concept_graph import ConceptGraphBuilder, CONCEPT_GRAPH_FILE
+from rag.ingestion_state import (
+    KNOWLEDGE_FILES,
+    INGESTION_METADATA_FILE,
+    COLLECTION_MANIFEST_FILE,
+    file_md5,
+    load_ingestion_state,
+    save_ingestion_state,
+    load_collection_manifest,
+    needs_ingestion,
+    ingestion_lock
+)
+from rag.chunking import create_document_chunks, chunk_concepts, iter_json_array
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Chunking processes (1 = chunk inline in this process)
+RAG_INGEST_WORKERS = int(os.getenv('RAG_INGEST_WORKERS', '1'))
+# Chunks per embedding/upsert batch
+RAG_INGEST_BATCH_SIZE = int(os.getenv('RAG_INGEST_BATCH_SIZE', '256'))
+# Concepts per chunking task
+RAG_INGEST_CONCEPT_BATCH = int(os.getenv('RAG_INGEST_CONCEPT_BATCH', '64'))
+
 class RAGIngestion:
     def __init__(self, rag_folder: str = "rag"):
         self.rag_folder = rag_folder
         self.db_path = os.path.join(rag_folder, "chroma_db")
-        self.metadata_path = os.path.join(rag_folder, "ingestion_metadata.json")
+        self.metadata_path = os.path.join(rag_folder, INGESTION_METADATA_FILE)
+        self.bm25_path = os.path.join(rag_folder, BM25_INDEX_FILE)
+        self.concept_graph_path = os.path.join(rag_folder, CONCEPT_GRAPH_FILE)
+        self.manifest_path = os.path.join(rag_folder, COLLECTION_MANIFEST_FILE)
         
-        # Initialize ChromaDB
+        # Initialize ChromaDB (imported here: it is slow to import and only needed once RAG is used)
+        import chromadb
         self.client = chromadb.PersistentClient(path=self.db_path)
         self.collection = self.client.get_or_create_collection(
             name="financial_knowledge",
             metadata={"description": "Financial concepts, strategies, and risk management"}
         )
         
-        # Initialize sentence transformer
-        self.model = SentenceTransformer('all-MiniLM-L6-v2')
+        # Shared sentence transformer (loaded once per process)
+        self.embedder = get_embedding_service()
+        
+        # Persistent content-hash -> embedding cache, reused across rebuilds
+        self.embedding_cache = EmbeddingCache(self.embedder.model_id)
+        
+        # Streaming pipeline settings
+        self.workers = max(1, RAG_INGEST_WORKERS)
+        self.batch_size = RAG_INGEST_BATCH_SIZE
+        self.concept_batch_size = RAG_INGEST_CONCEPT_BATCH
         
         # JSON files to process
-        self.json_files = [
-            "technical_strategies.json",
-            "investment_styles.json", 
-            "risk_management.json"
-        ]
+        self.json_files = list(KNOWLEDGE_FILES)
 
     def get_file_hash(self, filepath: str) -> str:
         """Calculate MD5 hash of a file"""
-        hash_md5 = hashlib.md5()
-        try:
-            with open(filepath, "rb") as f:
-                for chunk in iter(lambda: f.read(4096), b""):
-                    hash_md5.update(chunk)
-            return hash_md5.hexdigest()
-        except FileNotFoundError:
-            return ""
+        return file_md5(filepath)
 
-    def load_metadata(self) -> Dict[str, str]:
-        """Load ingestion metadata (file hashes)"""
-        try:
-            with open(self.metadata_path, "r") as f:
-                return json.load(f)
-        except FileNotFoundError:
-            return {}
+    def load_metadata(self) -> Dict[str, Dict[str, Any]]:
+        """Load ingestion metadata (file fingerprints)"""
+        return load_ingestion_state(self.rag_folder)
 
-    def save_metadata(self, metadata: Dict[str, str]):
-        """Save ingestion metadata"""
-        os.makedirs(self.rag_folder, exist_ok=True)
-        with open(self.metadata_path, "w") as f:
-            json.dump(metadata, f, indent=2)
+    def save_metadata(self):
+        """Save fingerprints of the knowledge files"""
+        save_ingestion_state(self.rag_folder, self.json_files)
 
     def check_if_ingestion_needed(self) -> bool:
         """Check if any files have changed since last ingestion"""
-        current_metadata = self.load_metadata()
-        
-        for json_file in self.json_files:
-            filepath = os.path.join(self.rag_folder, json_file)
-            if not os.path.exists(filepath):
-                continue
-                
-            current_hash = self.get_file_hash(filepath)
-            stored_hash = current_metadata.get(json_file, "")
-            
-            if current_hash != stored_hash:
-                logger.info(f"File {json_file} has changed or is new. Ingestion needed.")
-                return True
+        if needs_ingestion(self.rag_folder, self.json_files, self.embedder.model_id):
+            return True
         
-        # Check if collection is empty
+        # The DB is open anyway: make sure it wasn't emptied behind the manifest's back
         try:
             count = self.collection.count()
             if count == 0:
@@ -87,134 +99,77 @@ class RAGIngestion:
         logger.info("No changes detected. Skipping ingestion.")
         return False
 
+    def embedding_model_changed(self) -> bool:
+        """True when the stored vectors were made by a different model or inference backend"""
+        manifest = load_collection_manifest(self.rag_folder)
+        return manifest is not None and manifest.get("embedding_model") != self.embedder.model_id
+
     def create_document_chunks(self, concept: Dict[str, Any]) -> List[Dict[str, Any]]:
         """Create multiple document chunks from a single concept"""
-        chunks = []
-        
-        # Main concept chunk
-        main_content = f"""
-        Title: {concept['title']}
-        Category: {concept['category']}
-        
-        Concept: {concept['concept']}
-        
-        Calculation: {concept.get('calculation', 'N/A')}
-        
-        Parameters: {concept.get('parameters', 'N/A')}
-        """
-        
-        chunks.append({
-            'content': main_content.strip(),
-            'metadata': {
-                'title': concept['title'],
-                'category': concept['category'],
-                'chunk_type': 'main_concept',
-                'source': concept.get('source_file', 'unknown')
-            }
-        })
-        
-        # Use cases chunk
-        if concept.get('use_cases'):
-            use_cases_content = f"""
-            {concept['title']} - Use Cases:
-            
-            {chr(10).join([f"• {use_case}" for use_case in concept['use_cases']])}
-            """
-            
-            chunks.append({
-                'content': use_cases_content.strip(),
-                'metadata': {
-                    'title': concept['title'],
-                    'category': concept['category'],
-                    'chunk_type': 'use_cases',
-                    'source': concept.get('source_file', 'unknown')
-                }
-            })
-        
-        # Advantages and disadvantages chunk
-        advantages = concept.get('advantages', [])
-        disadvantages = concept.get('disadvantages', [])
-        
-        if advantages or disadvantages:
-            pros_cons_content = f"{concept['title']} - Pros and Cons:\n\n"
-            
-            if advantages:
-                pros_cons_content += f"Advantages:\n{chr(10).join([f'• {adv}' for adv in advantages])}\n\n"
-            
-            if disadvantages:
-                pros_cons_content += f"Disadvantages:\n{chr(10).join([f'• {dis}' for dis in disadvantages])}"
-            
-            chunks.append({
-                'content': pros_cons_content.strip(),
-                'metadata': {
-                    'title': concept['title'],
-                    'category': concept['category'],
-                    'chunk_type': 'pros_cons',
-                    'source': concept.get('source_file', 'unknown')
-                }
-            })
-        
-        # Example chunk
-        if concept.get('example'):
-            example_content = f"""
-            {concept['title']} - Example:
-            
-            {concept['example']}
-            """
-            
-            chunks.append({
-                'content': example_content.strip(),
-                'metadata': {
-                    'title': concept['title'],
-                    'category': concept['category'],
-                    'chunk_type': 'example',
-                    'source': concept.get('source_file', 'unknown')
-                }
-            })
-        
-        # Variations chunk
-        if concept.get('variations'):
-            variations_content = f"""
-            {concept['title']} - Variations:
-            
-            {chr(10).join([f"• {var}" for var in concept['variations']])}
-            """
-            
-            chunks.append({
-                'content': variations_content.strip(),
-                'metadata': {
-                    'title': concept['title'],
-                    'category': concept['category'],
-                    'chunk_type': 'variations',
-                    'source': concept.get('source_file', 'unknown')
-                }
-            })
-        
-        return chunks
+        return create_document_chunks(concept)
 
-    def ingest_json_file(self, json_file: str) -> List[Dict[str, Any]]:
-        """Load and process a JSON file"""
+    def iter_json_file_chunks(self, json_file: str, pool: Optional[ProcessPoolExecutor] = None) -> Iterator[Dict[str, Any]]:
+        """Stream chunks from a JSON file without loading it fully.
+
+        Concepts are parsed incrementally and chunked in batches of
+        concept_batch_size, in the process pool when one is given. At most
+        two batches per worker are in flight, which bounds memory.
+        """
         filepath = os.path.join(self.rag_folder, json_file)
         
         if not os.path.exists(filepath):
             logger.warning(f"File {filepath} not found. Skipping.")
-            return []
+            return
+        
+        concept_count = 0
+        chunk_count = 0
+        max_in_flight = 2 * self.workers
+        in_flight = deque()
+        batch = []
+        
+        def drain(limit):
+            while len(in_flight) > limit:
+                yield from in_flight.popleft().result()
         
         try:
-            with open(filepath, 'r', encoding='utf-8') as f:
-                data = json.load(f)
+            for concept in iter_json_array(filepath):
+                batch.append(concept)
+                concept_count += 1
+                if len(batch) < self.concept_batch_size:
+                    continue
+                if pool is None:
+                    chunks = chunk_concepts(batch, json_file)
+                    chunk_count += len(chunks)
+                    yield from chunks
+                else:
+                    in_flight.append(pool.submit(chunk_concepts, batch, json_file))
+                    for chunk in drain(max_in_flight):
+                        chunk_count += 1
+                        yield chunk
+                batch = []
             
-            all_chunks = []
-            for concept in data:
-                concept['source_file'] = json_file
-                chunks = self.create_document_chunks(concept)
-                all_chunks.extend(chunks)
+            if batch:
+                if pool is None:
+                    chunks = chunk_concepts(batch, json_file)
+                    chunk_count += len(chunks)
+                    yield from chunks
+                else:
+                    in_flight.append(pool.submit(chunk_concepts, batch, json_file))
+            for chunk in drain(0):
+                chunk_count += 1
+                yield chunk
             
-            logger.info(f"Processed {len(data)} concepts from {json_file} into {len(all_chunks)} chunks")
-            return all_chunks
+            logger.info(f"Processed {concept_count} concepts from {json_file} into {chunk_count} chunks")
             
         except Exception as e:
             logger.error(f"Error processing {json_file}: {e}")
+            raise
+
+    def ingest_json_file(self, json_file: str) -> List[Dict[str, Any]]:
+        """Load and process a JSON file"""
+        try:
+            return list(self.iter_json_file_chunks(json_file))
+        except Exception:
             return []
 
     def clear_collection(self):
@@ -229,67 +184,193 @@ class RAGIngestion:
         except Exception as e:
             logger.info(f"Collection didn't exist or couldn't be cleared: {e}")
 
-    def perform_ingestion(self):
-        """Perform the complete ingestion process"""
+    @staticmethod
+    def get_chunk_id(chunk: Dict[str, Any]) -> str:
+        """Stable content-hash ID for a chunk (same text and metadata -> same ID)"""
+        payload = json.dumps({'content': chunk['content'], 'metadata': chunk['metadata']}, sort_keys=True)
+        return "chunk_" + hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+    def get_stored_ids(self) -> set:
+        """IDs of all chunks currently in the collection"""
+        return set(self.collection.get(include=[])['ids'])
+
+    def _embed_and_upsert(self, pending: List[Tuple[str, Dict[str, Any]]]):
+        """Embed one batch of new/changed chunks and upsert it into ChromaDB"""
+        contents = [chunk['content'] for _, chunk in pending]
+        embeddings = self.embedding_cache.encode(contents, self.embedder.encode)
+        self.collection.upsert(
+            embeddings=embeddings.tolist(),
+            documents=contents,
+            metadatas=[chunk['metadata'] for _, chunk in pending],
+            ids=[chunk_id for chunk_id, _ in pending]
+        )
+
+    def save_manifest(self, field_counts: Dict[str, Counter], chunk_ids: set):
+        """Write collection statistics so retrieval can report them without scanning metadata.
+
+        content_hash covers the (content-derived) chunk IDs and the embedding
+        model, so it only changes when what retrieval can return changes.
+        """
+        content = hashlib.sha256(self.embedder.model_id.encode("utf-8"))
+        for chunk_id in sorted(chunk_ids):
+            content.update(f"\n{chunk_id}".encode("utf-8"))
+        manifest = {
+            "total_documents": len(chunk_ids),
+            "content_hash": content.hexdigest(),
+            "categories": dict(field_counts['category']),
+            "chunk_types": dict(field_counts['chunk_type']),
+            "sources": dict(field_counts['source']),
+            "embedding_model": self.embedder.model_id,
+            "embedding_dim": self.embedding_cache.dim or self.embedder.dimension,
+            "updated_at": datetime.now(timezone.utc).isoformat()
+        }
+        # Write-then-rename: serving processes read the manifest while it is rewritten
+        tmp_path = f"{self.manifest_path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(tmp_path, self.manifest_path)
+
+    def build_concept_graph(self):
+        """Precompute related concepts from the stored chunk embeddings.
+
+        The collection is read page by page into per-concept centroids, so
+        only one page of embeddings is held in memory at a time.
+        """
+        builder = ConceptGraphBuilder()
+        total = self.collection.count()
+        for offset in range(0, total, self.batch_size):
+            page = self.collection.get(include=['documents', 'metadatas', 'embeddings'],
+                                       limit=self.batch_size, offset=offset)
+            builder.add(page['ids'], page['documents'], page['metadatas'], page['embeddings'])
+        
+        graph = builder.build()
+        graph.save(self.concept_graph_path)
+        logger.info(f"Saved concept graph for {len(graph.concepts)} concepts to {self.concept_graph_path}")
+
+    def perform_ingestion(self, full_rebuild: bool = False):
+        """Perform the ingestion process, holding the cross-process ingestion lock"""
+        with ingestion_lock(self.rag_folder):
+            self._perform_ingestion(full_rebuild)
+
+    def _perform_ingestion(self, full_rebuild: bool = False):
+        """Perform the ingestion process.
+
+        Chunks are identified by a hash of their content, so only new or
+        changed chunks are embedded and added, and chunks that no longer exist
+        in the JSON files are deleted. full_rebuild drops the collection first.
+        Files are streamed: chunks are embedded and upserted in fixed-size
+        batches, so memory stays bounded as the knowledge base grows.
+        """
         logger.info("Starting RAG ingestion process...")
+        start_time = time.perf_counter()
         
-        # Clear existing data
-        self.clear_collection()
+        if full_rebuild:
+            self.clear_collection()
         
-        # Process all files
-        all_documents = []
-        for json_file in self.json_files:
-            chunks = self.ingest_json_file(json_file)
-            all_documents.extend(chunks)
+        # Diff against what is already stored
+        stored_ids = self.get_stored_ids()
+        seen_ids = set()
+        bm25 = BM25Builder()
+        field_counts = {field: Counter() for field in ('category', 'chunk_type', 'source')}
+        pending = []
+        new_count = 0
+        
+        pool = None
+        if self.workers > 1:
+            # forkserver/spawn: this may run in a server's background thread
+            # with the embedding model loaded, which is not safe to fork
+            methods = multiprocessing.get_all_start_methods()
+            context = multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+            pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=context)
+        try:
+            for json_file in self.json_files:
+                for chunk in self.iter_json_file_chunks(json_file, pool):
+                    chunk_id = self.get_chunk_id(chunk)
+                    if chunk_id in seen_ids:
+                        continue
+                    seen_ids.add(chunk_id)
+                    bm25.add(chunk_id, chunk['content'], chunk['metadata'].get('title', ''))
+                    for field, counts in field_counts.items():
+                        counts[chunk['metadata'].get(field, 'Unknown')] += 1
+                    if chunk_id in stored_ids:
+                        continue
+                    
+                    pending.append((chunk_id, chunk))
+                    if len(pending) >= self.batch_size:
+                        self._embed_and_upsert(pending)
+                        new_count += len(pending)
+                        pending = []
+                        elapsed = time.perf_counter() - start_time
+                        logger.info(f"Ingested {new_count} new chunks ({len(seen_ids) / elapsed:.1f} chunks/s processed)")
+            
+            if pending:
+                self._embed_and_upsert(pending)
+                new_count += len(pending)
+        except Exception as e:
+            # Re-raised so callers don't report a failed or partial run as finished
+            logger.error(f"Ingestion failed: {e}")
+            raise
+        finally:
+            if pool is not None:
+                pool.shutdown()
         
-        if not all_documents:
+        if not seen_ids:
             logger.warning("No documents to ingest!")
             return
         
-        # Generate embeddings
-        logger.info(f"Generating embeddings for {len(all_documents)} document chunks...")
-        contents = [doc['content'] for doc in all_documents]
-        embeddings = self.model.encode(contents, show_progress_bar=True)
+        removed_ids = [doc_id for doc_id in stored_ids if doc_id not in seen_ids]
+        if removed_ids:
+            logger.info(f"Deleting {len(removed_ids)} removed chunks from ChromaDB...")
+            for i in range(0, len(removed_ids), self.batch_size):
+                self.collection.delete(ids=removed_ids[i:i + self.batch_size])
         
-        # Prepare data for ChromaDB
-        ids = [f"doc_{i}" for i in range(len(all_documents))]
-        metadatas = [doc['metadata'] for doc in all_documents]
-        documents = contents
+        # Lexical index over every current chunk, for hybrid retrieval
+        bm25.build().save(self.bm25_path)
+        logger.info(f"Saved BM25 index over {len(seen_ids)} chunks to {self.bm25_path}")
         
-        # Add to ChromaDB
-        logger.info("Adding documents to ChromaDB...")
-        self.collection.add(
-            embeddings=embeddings.tolist(),
-            documents=documents,
-            metadatas=metadatas,
-            ids=ids
-        )
+        self.build_concept_graph()
+        self.save_manifest(field_counts, seen_ids)
         
         # Update metadata
-        current_metadata = {}
-        for json_file in self.json_files:
-            filepath = os.path.join(self.rag_folder, json_file)
-            if os.path.exists(filepath):
-                current_metadata[json_file] = self.get_file_hash(filepath)
+        self.save_metadata()
         
-        self.save_metadata(current_metadata)
+        # Cached answers may be based on the old knowledge
+        if new_count or removed_ids:
+            invalidate_answer_cache()
         
-        logger.info(f"Successfully ingested {len(all_documents)} documents!")
+        elapsed = time.perf_counter() - start_time
+        logger.info(f"{len(seen_ids)} chunks: {new_count} new/changed, {len(removed_ids)} removed, "
+                    f"{len(seen_ids) - new_count} unchanged")
+        logger.info(f"Ingestion took {elapsed:.2f}s ({len(seen_ids) / elapsed:.1f} chunks/s, "
+                    f"{new_count / elapsed:.1f} embedded chunks/s)")
         logger.info(f"Collection now contains {self.collection.count()} documents")
 
     def run_ingestion_if_needed(self):
         """Main entry point - only run ingestion if needed"""
-        if self.check_if_ingestion_needed():
-            self.perform_ingestion()
-        else:
-            logger.info("Ingestion not needed - all files are up to date")
+        # Checked under the lock: a process that waited for another one's
+        # ingestion then finds the knowledge base up to date
+        with ingestion_lock(self.rag_folder):
+            if self.check_if_ingestion_needed():
+                # Vectors from different models can't be mixed in one collection
+                self._perform_ingestion(full_rebuild=self.embedding_model_changed())
+            else:
+                logger.info("Ingestion not needed - all files are up to date")
 
 
 def main():
     """Main function to run ingestion"""
+    parser = argparse.ArgumentParser(description="Ingest the financial knowledge base into ChromaDB")
+    parser.add_argument("--rebuild", action="store_true", help="drop the collection and re-embed everything")
+    args = parser.parse_args()
+    
+    # A one-off batch job: encode locally if the embedding sidecar isn't running (yet)
+    get_embedding_service().sidecar_fallback = True
     ingestion = RAGIngestion()
-    ingestion.run_ingestion_if_needed()
+    if args.rebuild:
+        ingestion.perform_ingestion(full_rebuild=True)
+    else:
+        ingestion.run_ingestion_if_needed()
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
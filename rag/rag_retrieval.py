@@ -1,17 +1,62 @@
 import os
-import chromadb
-from sentence_transformers import SentenceTransformer
+import re
+import threading
+from collections import OrderedDict
+import numpy as np
 from typing import List, Dict, Any, Optional
 import logging
+from rag.bm25 import BM25Index, BM25_INDEX_FILE, reciprocal_rank_fusion
+from rag.concept_graph import ConceptGraph, CONCEPT_GRAPH_FILE
+from rag.context_builder import build_context, RAG_CONTEXT_TOKEN_BUDGET
+from rag.embeddings import get_embedding_service
+from rag.ingestion_state import load_collection_manifest
+from rag.vector_backends import create_backend, NumpyBackend, RAG_BACKEND
 
 logger = logging.getLogger(__name__)
 
+# Number of distinct query embeddings kept in memory
+RAG_QUERY_CACHE_SIZE = int(os.getenv('RAG_QUERY_CACHE_SIZE', '1024'))
+
+# Hybrid retrieval: fuse BM25 keyword ranking with vector ranking
+RAG_HYBRID_SEARCH = os.getenv('RAG_HYBRID_SEARCH', 'true').lower() == 'true'
+RAG_HYBRID_CANDIDATES = int(os.getenv('RAG_HYBRID_CANDIDATES', '20'))
+RAG_RRF_K = int(os.getenv('RAG_RRF_K', '60'))
+# Keyword evidence that lets a chunk below the similarity threshold still count as relevant:
+# share of the query's (IDF-weighted) terms it contains, how many distinct terms matched,
+# and the vector similarity it must still reach
+RAG_LEXICAL_THRESHOLD = float(os.getenv('RAG_LEXICAL_THRESHOLD', '0.6'))
+RAG_LEXICAL_MIN_TERMS = int(os.getenv('RAG_LEXICAL_MIN_TERMS', '2'))
+RAG_LEXICAL_MIN_SIMILARITY = float(os.getenv('RAG_LEXICAL_MIN_SIMILARITY', '0.2'))
+
+# NumPy index loaded once in a pre-fork parent and shared copy-on-write by workers
+_shared_backend = None
+
+def preload_shared_index(rag_folder: str = "rag") -> Optional[NumpyBackend]:
+    """Load the in-memory NumPy index before worker processes are forked.
+
+    Chroma is opened only long enough to read the embeddings: its SQLite
+    handles and background threads must not be inherited across fork, so
+    each worker opens its own client on first use.
+    """
+    global _shared_backend
+    import chromadb
+    from chromadb.api.client import SharedSystemClient
+
+    client = chromadb.PersistentClient(path=os.path.join(rag_folder, "chroma_db"))
+    try:
+        _shared_backend = NumpyBackend.from_collection(client.get_collection(name="financial_knowledge"))
+    finally:
+        SharedSystemClient.clear_system_cache()
+        del client
+    return _shared_backend
+
 class RAGRetrieval:
-    def __init__(self, rag_folder: str = "rag"):
+    def __init__(self, rag_folder: str = "rag", backend: str = RAG_BACKEND):
         self.rag_folder = rag_folder
         self.db_path = os.path.join(rag_folder, "chroma_db")
         
-        # Initialize ChromaDB client
+        # Initialize ChromaDB client (imported here: it is slow to import and only needed once RAG is used)
+        import chromadb
         self.client = chromadb.PersistentClient(path=self.db_path)
         
         try:
@@ -20,12 +65,67 @@ class RAGRetrieval:
             logger.warning(f"Could not load collection: {e}")
             self.collection = None
         
-        # Initialize sentence transformer (same model as ingestion)
-        self.model = SentenceTransformer('all-MiniLM-L6-v2')
+        # Vector search backend (Chroma HNSW or in-memory NumPy exact search)
+        try:
+            if backend == "numpy" and _shared_backend is not None:
+                self.backend = _shared_backend
+            else:
+                self.backend = create_backend(self.collection, backend)
+        except Exception as e:
+            logger.warning(f"Could not initialize {backend} backend: {e}")
+            self.backend = None
+        
+        # Lexical index built at ingestion time (None disables hybrid search)
+        self.bm25 = BM25Index.load(os.path.join(rag_folder, BM25_INDEX_FILE)) if RAG_HYBRID_SEARCH else None
+        
+        # Related-concepts graph precomputed at ingestion time
+        self.concept_graph = ConceptGraph.load(os.path.join(rag_folder, CONCEPT_GRAPH_FILE))
+        
+        # Collection statistics written at ingestion time
+        self.manifest = load_collection_manifest(rag_folder)
+        self._document_count = 0
+        
+        # Shared sentence transformer (same instance as ingestion)
+        self.embedder = get_embedding_service()
+        
+        # LRU cache of query embeddings: normalized query text -> float32 vector
+        self._query_cache = OrderedDict()
+        self._query_cache_lock = threading.Lock()
+        self.query_cache_size = RAG_QUERY_CACHE_SIZE
+
+    @staticmethod
+    def normalize_query(query: str) -> str:
+        """Normalize query text for caching (MiniLM is uncased, so this doesn't change the embedding)"""
+        return re.sub(r'\s+', ' ', query.strip().lower())
+
+    def embed_query(self, query: str) -> np.ndarray:
+        """Embed a query, reusing the cached vector when the same text was seen before"""
+        key = self.normalize_query(query)
+        with self._query_cache_lock:
+            embedding = self._query_cache.get(key)
+            if embedding is not None:
+                self._query_cache.move_to_end(key)
+                return embedding
+        
+        embedding = self.embedder.encode([key])[0]
+        embedding.setflags(write=False)
+        
+        with self._query_cache_lock:
+            self._query_cache[key] = embedding
+            self._query_cache.move_to_end(key)
+            while len(self._query_cache) > self.query_cache_size:
+                self._query_cache.popitem(last=False)
+        return embedding
 
     def is_available(self) -> bool:
         """Check if RAG system is available"""
-        return self.collection is not None and self.collection.count() > 0
+        if self.backend is None:
+            return False
+        # The collection only changes through ingestion, so a non-empty
+        # count is remembered instead of being queried on every search
+        if self._document_count == 0:
+            self._document_count = self.backend.count()
+        return self._document_count > 0
 
     def search_knowledge(self, query: str, top_k: int = 5) -> List[Dict[str, Any]]:
         """Search the knowledge base for relevant information"""
@@ -35,67 +135,64 @@ class RAGRetrieval:
         
         try:
             # Generate query embedding
-            query_embedding = self.model.encode([query])
+            query_embedding = self.embed_query(query)
             
-            # Search in ChromaDB
-            results = self.collection.query(
-                query_embeddings=query_embedding.tolist(),
-                n_results=top_k,
-                include=['documents', 'metadatas', 'distances']
-            )
-            
-            # Format results
-            formatted_results = []
-            if results['documents'] and len(results['documents']) > 0:
-                documents = results['documents'][0]
-                metadatas = results['metadatas'][0]
-                distances = results['distances'][0]
-                
-                for doc, metadata, distance in zip(documents, metadatas, distances):
-                    formatted_results.append({
-                        'content': doc,
-                        'metadata': metadata,
-                        'similarity_score': 1 - distance,  # Convert distance to similarity
-                        'distance': distance
-                    })
-            
-            return formatted_results
+            if self.bm25 is None:
+                return self.backend.query(query_embedding, n_results=top_k)
+            return self.hybrid_search(query, query_embedding, top_k)
             
         except Exception as e:
             logger.error(f"Error during RAG search: {e}")
             return []
 
+    def hybrid_search(self, query: str, query_embedding: np.ndarray, top_k: int = 5) -> List[Dict[str, Any]]:
+        """Fuse vector and BM25 rankings with reciprocal rank fusion.
+
+        Keyword-heavy queries ("RSI 14 period", "Kelly criterion") are ranked
+        well by BM25 even when MiniLM similarity is flat. Results come back in
+        fused order with rrf_score, bm25_score, lexical_coverage and
+        lexical_matches (distinct query terms found); chunks
+        found only lexically are fetched from the backend so every result
+        still carries its vector similarity_score.
+        """
+        pool = max(top_k, RAG_HYBRID_CANDIDATES)
+        vector_results = self.backend.query(query_embedding, n_results=pool)
+        lexical_results = self.bm25.search_with_coverage(query, top_k=pool)
+        if not lexical_results:
+            return vector_results[:top_k]
+        
+        fused = reciprocal_rank_fusion(
+            [[r['id'] for r in vector_results], [doc_id for doc_id, _, _, _ in lexical_results]], k=RAG_RRF_K
+        )
+        ranked_ids = sorted(fused, key=fused.get, reverse=True)[:top_k]
+        
+        by_id = {r['id']: r for r in vector_results}
+        missing_ids = [doc_id for doc_id in ranked_ids if doc_id not in by_id]
+        for result in self.backend.get(missing_ids, query_embedding):
+            by_id[result['id']] = result
+        
+        lexical = {doc_id: (score, coverage, matches) for doc_id, score, coverage, matches in lexical_results}
+        results = []
+        for doc_id in ranked_ids:
+            result = by_id.get(doc_id)
+            if result is None:  # stale index entry
+                continue
+            result['rrf_score'] = fused[doc_id]
+            result['bm25_score'], result['lexical_coverage'], result['lexical_matches'] = \
+                lexical.get(doc_id, (0.0, 0.0, 0))
+            results.append(result)
+        return results
+
     def search_by_category(self, query: str, category: str, top_k: int = 3) -> List[Dict[str, Any]]:
         """Search within a specific category"""
         if not self.is_available():
             return []
         
         try:
-            query_embedding = self.model.encode([query])
+            query_embedding = self.embed_query(query)
             
             # Search with category filter
-            results = self.collection.query(
-                query_embeddings=query_embedding.tolist(),
-                n_results=top_k,
-                where={"category": category},
-                include=['documents', 'metadatas', 'distances']
-            )
-            
-            formatted_results = []
-            if results['documents'] and len(results['documents']) > 0:
-                documents = results['documents'][0]
-                metadatas = results['metadatas'][0]
-                distances = results['distances'][0]
-                
-                for doc, metadata, distance in zip(documents, metadatas, distances):
-                    formatted_results.append({
-                        'content': doc,
-                        'metadata': metadata,
-                        'similarity_score': 1 - distance,
-                        'distance': distance
-                    })
-            
-            return formatted_results
+            return self.backend.query(query_embedding, n_results=top_k, where={"category": category})
             
         except Exception as e:
             logger.error(f"Error during category search: {e}")
@@ -106,36 +203,29 @@ class RAGRetrieval:
         if not self.is_available():
             return []
         
+        # Known concept: read its precomputed neighbours
+        if self.concept_graph is not None:
+            related = self.concept_graph.related(concept_title, top_k)
+            if related is not None:
+                return related
+        
         try:
             # Search using the concept title
-            query_embedding = self.model.encode([concept_title])
+            query_embedding = self.embed_query(concept_title)
             
-            results = self.collection.query(
-                query_embeddings=query_embedding.tolist(),
-                n_results=top_k + 5,  # Get more to filter out the original concept
-                include=['documents', 'metadatas', 'distances']
-            )
+            # Get more to filter out the original concept
+            results = self.backend.query(query_embedding, n_results=top_k + 5)
             
             formatted_results = []
-            if results['documents'] and len(results['documents']) > 0:
-                documents = results['documents'][0]
-                metadatas = results['metadatas'][0]
-                distances = results['distances'][0]
-                
-                for doc, metadata, distance in zip(documents, metadatas, distances):
-                    # Skip if it's the same concept
-                    if metadata.get('title', '').lower() == concept_title.lower():
-                        continue
-                        
-                    formatted_results.append({
-                        'content': doc,
-                        'metadata': metadata,
-                        'similarity_score': 1 - distance,
-                        'distance': distance
-                    })
+            for result in results:
+                # Skip if it's the same concept
+                if result['metadata'].get('title', '').lower() == concept_title.lower():
+                    continue
                     
-                    if len(formatted_results) >= top_k:
-                        break
+                formatted_results.append(result)
+                
+                if len(formatted_results) >= top_k:
+                    break
             
             return formatted_results
             
@@ -149,30 +239,9 @@ class RAGRetrieval:
             return []
         
         try:
-            query_embedding = self.model.encode([query])
-            
-            results = self.collection.query(
-                query_embeddings=query_embedding.tolist(),
-                n_results=top_k,
-                where={"chunk_type": "example"},
-                include=['documents', 'metadatas', 'distances']
-            )
+            query_embedding = self.embed_query(query)
             
-            formatted_results = []
-            if results['documents'] and len(results['documents']) > 0:
-                documents = results['documents'][0]
-                metadatas = results['metadatas'][0]
-                distances = results['distances'][0]
-                
-                for doc, metadata, distance in zip(documents, metadatas, distances):
-                    formatted_results.append({
-                        'content': doc,
-                        'metadata': metadata,
-                        'similarity_score': 1 - distance,
-                        'distance': distance
-                    })
-            
-            return formatted_results
+            return self.backend.query(query_embedding, n_results=top_k, where={"chunk_type": "example"})
             
         except Exception as e:
             logger.error(f"Error searching examples: {e}")
@@ -183,18 +252,37 @@ class RAGRetrieval:
         if not self.is_available():
             return {"status": "unavailable", "count": 0}
         
+        if self.manifest is not None:
+            return {
+                "status": "available",
+                "total_documents": self.manifest["total_documents"],
+                "categories": list(self.manifest["categories"]),
+                "chunk_types": list(self.manifest["chunk_types"]),
+                "sources": list(self.manifest["sources"]),
+                "category_counts": self.manifest["categories"],
+                "chunk_type_counts": self.manifest["chunk_types"],
+                "source_counts": self.manifest["sources"],
+                "embedding_model": self.manifest.get("embedding_model"),
+                "embedding_dim": self.manifest.get("embedding_dim"),
+                "updated_at": self.manifest.get("updated_at"),
+                "db_path": self.db_path,
+                "backend": self.backend.name,
+                "hybrid_search": self.bm25 is not None
+            }
+        
+        # No manifest (knowledge base ingested by an older version): scan metadata
         try:
-            count = self.collection.count()
+            count = self.backend.count()
             
             # Get all metadatas to analyze
-            all_results = self.collection.get(include=['metadatas'])
+            all_metadatas = self.backend.get_metadatas()
             
             categories = set()
             chunk_types = set()
             sources = set()
             
-            if all_results['metadatas']:
-                for metadata in all_results['metadatas']:
+            if all_metadatas:
+                for metadata in all_metadatas:
                     categories.add(metadata.get('category', 'Unknown'))
                     chunk_types.add(metadata.get('chunk_type', 'Unknown'))
                     sources.add(metadata.get('source', 'Unknown'))
@@ -205,36 +293,36 @@ class RAGRetrieval:
                 "categories": list(categories),
                 "chunk_types": list(chunk_types),
                 "sources": list(sources),
-                "db_path": self.db_path
+                "db_path": self.db_path,
+                "backend": self.backend.name,
+                "hybrid_search": self.bm25 is not None
             }
             
         except Exception as e:
             logger.error(f"Error getting collection stats: {e}")
             return {"status": "error", "error": str(e)}
 
-    def format_search_results_for_llm(self, results: List[Dict[str, Any]], max_results: int = 3) -> str:
-        """Format search results for LLM context"""
-        if not results:
-            return ""
-        
-        formatted_context = "Relevant Financial Knowledge:\n\n"
-        
-        for i, result in enumerate(results[:max_results], 1):
-            content = result['content']
-            metadata = result['metadata']
-            similarity = result['similarity_score']
-            
-            formatted_context += f"[Knowledge {i}] (Relevance: {similarity:.2f})\n"
-            formatted_context += f"Title: {metadata.get('title', 'N/A')}\n"
-            formatted_context += f"Category: {metadata.get('category', 'N/A')}\n"
-            formatted_context += f"Type: {metadata.get('chunk_type', 'N/A')}\n"
-            formatted_context += f"Content:\n{content}\n"
-            formatted_context += "-" * 50 + "\n\n"
-        
-        return formatted_context
+    def format_search_results_for_llm(self, results: List[Dict[str, Any]], max_results: Optional[int] = None,
+                                      max_tokens: int = RAG_CONTEXT_TOKEN_BUDGET) -> str:
+        """Format search results for LLM context, packed into a token budget"""
+        return build_context(results, max_tokens=max_tokens, max_results=max_results)
+
+    def smart_search(self, query: str, similarity_threshold: float = 0.3, top_k: int = 5,
+                     lexical_threshold: float = RAG_LEXICAL_THRESHOLD) -> Dict[str, Any]:
+        """Search once and keep the relevant results, in ranked (fused) order.
+
+        Vector similarity is the main gate: a result is relevant if it passes
+        similarity_threshold. With hybrid search, a result just below it is
+        also kept when it contains at least lexical_threshold of the query's
+        terms (see BM25Index.search_with_coverage), matches at least
+        RAG_LEXICAL_MIN_TERMS distinct terms and still reaches
+        RAG_LEXICAL_MIN_SIMILARITY, so one common word ("market", "risk")
+        is not enough to pull an unrelated chunk into the context.
 
-    def smart_search(self, query: str, similarity_threshold: float = 0.3) -> Dict[str, Any]:
-        """Intelligent search that tries different strategies"""
+        There is no example-only retry: an example chunk's similarity can
+        never exceed the best unfiltered result, so a filtered query cannot
+        pass a threshold the general search missed.
+        """
         if not self.is_available():
             return {
                 "found_relevant": False,
@@ -243,11 +331,15 @@ class RAGRetrieval:
                 "results": []
             }
         
-        # First try general search
-        general_results = self.search_knowledge(query, top_k=5)
+        general_results = self.search_knowledge(query, top_k=top_k)
         
-        # Filter by similarity threshold
-        relevant_results = [r for r in general_results if r['similarity_score'] >= similarity_threshold]
+        # Vector evidence, or strong keyword evidence backed by some similarity;
+        # filtering keeps the search order
+        relevant_results = [r for r in general_results
+                            if r['similarity_score'] >= similarity_threshold
+                            or (r.get('lexical_coverage', 0.0) >= lexical_threshold
+                                and r.get('lexical_matches', 0) >= RAG_LEXICAL_MIN_TERMS
+                                and r['similarity_score'] >= RAG_LEXICAL_MIN_SIMILARITY)]
         
         if relevant_results:
             return {
@@ -258,21 +350,8 @@ class RAGRetrieval:
                 "total_checked": len(general_results)
             }
         
-        # If no relevant results, try searching for examples
-        example_results = self.search_examples(query, top_k=3)
-        example_relevant = [r for r in example_results if r['similarity_score'] >= similarity_threshold]
-        
-        if example_relevant:
-            return {
-                "found_relevant": True,
-                "context": self.format_search_results_for_llm(example_relevant),
-                "method": "example_search",
-                "results": example_relevant,
-                "total_checked": len(example_results)
-            }
-        
         # Return best results even if below threshold, but mark as low relevance
-        best_results = general_results[:2] if general_results else []
+        best_results = general_results[:2]
         return {
             "found_relevant": False,
             "context": self.format_search_results_for_llm(best_results) if best_results else "",
@@ -285,14 +364,23 @@ class RAGRetrieval:
 
 # Global instance for easy access
 _rag_retrieval = None
+_rag_retrieval_lock = threading.Lock()
 
 def get_rag_retrieval() -> RAGRetrieval:
     """Get global RAG retrieval instance"""
     global _rag_retrieval
     if _rag_retrieval is None:
-        _rag_retrieval = RAGRetrieval()
+        with _rag_retrieval_lock:
+            if _rag_retrieval is None:
+                _rag_retrieval = RAGRetrieval()
     return _rag_retrieval
 
+def reset_rag_retrieval():
+    """Drop the global instance so the next call reloads the re-ingested knowledge base"""
+    global _rag_retrieval
+    with _rag_retrieval_lock:
+        _rag_retrieval = None
+
 def search_financial_knowledge(query: str, top_k: int = 3) -> List[Dict[str, Any]]:
     """Convenience function for knowledge search"""
     rag = get_rag_retrieval()
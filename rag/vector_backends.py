@@ -0,0 +1,196 @@
+import os
+from typing import List, Dict, Any, Optional
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Vector search backend used by RAGRetrieval: "chroma" or "numpy"
+RAG_BACKEND = os.getenv('RAG_BACKEND', 'chroma').lower()
+
+
+def _format_result(doc_id: str, document: str, metadata: Dict[str, Any], distance: float) -> Dict[str, Any]:
+    return {
+        'id': doc_id,
+        'content': document,
+        'metadata': metadata,
+        'similarity_score': 1 - distance,  # Convert distance to similarity
+        'distance': distance
+    }
+
+
+def vector_distances(embeddings: np.ndarray, sq_norms: np.ndarray, query: np.ndarray, space: str) -> np.ndarray:
+    """Distances from query to each row, as Chroma computes them for the space"""
+    dots = embeddings @ query
+    if space == "cosine":
+        norms = np.sqrt(sq_norms) * max(float(np.linalg.norm(query)), 1e-12)
+        return 1.0 - dots / np.maximum(norms, 1e-12)
+    if space == "ip":
+        return 1.0 - dots
+    return sq_norms - 2.0 * dots + float(query @ query)
+
+
+class ChromaBackend:
+    """Vector search through the persistent ChromaDB collection (HNSW index)"""
+
+    name = "chroma"
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    def count(self) -> int:
+        return self.collection.count()
+
+    def query(self, embedding: np.ndarray, n_results: int,
+              where: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        kwargs = {"where": where} if where else {}
+        results = self.collection.query(
+            query_embeddings=[np.asarray(embedding, dtype=np.float32).tolist()],
+            n_results=n_results,
+            include=['documents', 'metadatas', 'distances'],
+            **kwargs
+        )
+
+        formatted_results = []
+        if results['documents'] and len(results['documents']) > 0:
+            for doc_id, doc, metadata, distance in zip(results['ids'][0], results['documents'][0],
+                                                       results['metadatas'][0], results['distances'][0]):
+                formatted_results.append(_format_result(doc_id, doc, metadata, distance))
+        return formatted_results
+
+    def get(self, ids: List[str], embedding: np.ndarray) -> List[Dict[str, Any]]:
+        """Fetch records by ID, scored against the query embedding"""
+        if not ids:
+            return []
+        records = self.collection.get(ids=list(ids), include=['documents', 'metadatas', 'embeddings'])
+        if not records['ids']:
+            return []
+        vectors = np.asarray(records['embeddings'], dtype=np.float32)
+        space = (self.collection.metadata or {}).get("hnsw:space", "l2")
+        distances = vector_distances(vectors, np.einsum('ij,ij->i', vectors, vectors),
+                                     np.asarray(embedding, dtype=np.float32).reshape(-1), space)
+        return [
+            _format_result(doc_id, doc, metadata, float(distance))
+            for doc_id, doc, metadata, distance in zip(records['ids'], records['documents'],
+                                                       records['metadatas'], distances)
+        ]
+
+    def get_metadatas(self) -> List[Dict[str, Any]]:
+        return self.collection.get(include=['metadatas'])['metadatas'] or []
+
+
+class NumpyBackend:
+    """Exact in-memory search over a contiguous float32 embedding matrix.
+
+    Top-k is one matrix-vector product plus argpartition; metadata filters
+    use boolean masks precomputed per (field, value). Distances follow the
+    collection's space (Chroma's default is squared L2), so similarity scores
+    and thresholds match the Chroma backend.
+    """
+
+    name = "numpy"
+
+    def __init__(self, ids: List[str], documents: List[str], metadatas: List[Dict[str, Any]],
+                 embeddings: np.ndarray, space: str = "l2"):
+        self.ids = list(ids)
+        self.documents = list(documents)
+        self.metadatas = list(metadatas)
+        self.embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+        self.space = space
+        self.sq_norms = np.einsum('ij,ij->i', self.embeddings, self.embeddings)
+        self.rows = {doc_id: row for row, doc_id in enumerate(self.ids)}
+
+        # (field, value) -> boolean row mask
+        self.masks = {}
+        for row, metadata in enumerate(self.metadatas):
+            for field, value in (metadata or {}).items():
+                mask = self.masks.get((field, value))
+                if mask is None:
+                    mask = self.masks[(field, value)] = np.zeros(len(self.ids), dtype=bool)
+                mask[row] = True
+
+    @classmethod
+    def from_collection(cls, collection) -> "NumpyBackend":
+        """Load every record of a Chroma collection into memory"""
+        records = collection.get(include=['documents', 'metadatas', 'embeddings'])
+        embeddings = records['embeddings']
+        if embeddings is None or len(embeddings) == 0:
+            embeddings = np.zeros((0, 0), dtype=np.float32)
+        space = (collection.metadata or {}).get("hnsw:space", "l2")
+        logger.info(f"Loaded {len(records['ids'])} embeddings into NumPy index")
+        return cls(records['ids'], records['documents'], records['metadatas'], np.asarray(embeddings), space)
+
+    def count(self) -> int:
+        return len(self.ids)
+
+    def _where_mask(self, where: Dict[str, Any]) -> np.ndarray:
+        """Evaluate a Chroma-style equality filter ({"field": value}, "$eq", "$and")"""
+        mask = np.ones(len(self.ids), dtype=bool)
+        for field, condition in where.items():
+            if field == "$and":
+                for clause in condition:
+                    mask &= self._where_mask(clause)
+                continue
+            if isinstance(condition, dict):
+                if set(condition) != {"$eq"}:
+                    raise ValueError(f"Unsupported filter for NumPy backend: {condition}")
+                condition = condition["$eq"]
+            field_mask = self.masks.get((field, condition))
+            if field_mask is None:
+                return np.zeros(len(self.ids), dtype=bool)
+            mask &= field_mask
+        return mask
+
+    def _distances(self, query: np.ndarray) -> np.ndarray:
+        return vector_distances(self.embeddings, self.sq_norms, query, self.space)
+
+    def query(self, embedding: np.ndarray, n_results: int,
+              where: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        if not self.ids or n_results <= 0:
+            return []
+
+        query = np.asarray(embedding, dtype=np.float32).reshape(-1)
+        distances = self._distances(query)
+
+        rows = np.arange(len(self.ids))
+        if where:
+            rows = np.flatnonzero(self._where_mask(where))
+            distances = distances[rows]
+            if len(rows) == 0:
+                return []
+
+        k = min(n_results, len(rows))
+        top = np.argpartition(distances, k - 1)[:k]
+        top = top[np.argsort(distances[top], kind='stable')]
+
+        return [
+            _format_result(self.ids[rows[i]], self.documents[rows[i]], self.metadatas[rows[i]], float(distances[i]))
+            for i in top
+        ]
+
+    def get(self, ids: List[str], embedding: np.ndarray) -> List[Dict[str, Any]]:
+        """Fetch records by ID, scored against the query embedding"""
+        rows = [self.rows[doc_id] for doc_id in ids if doc_id in self.rows]
+        if not rows:
+            return []
+        query = np.asarray(embedding, dtype=np.float32).reshape(-1)
+        distances = vector_distances(self.embeddings[rows], self.sq_norms[rows], query, self.space)
+        return [
+            _format_result(self.ids[row], self.documents[row], self.metadatas[row], float(distance))
+            for row, distance in zip(rows, distances)
+        ]
+
+    def get_metadatas(self) -> List[Dict[str, Any]]:
+        return self.metadatas
+
+
+def create_backend(collection, backend: str = RAG_BACKEND):
+    """Build the configured vector search backend over a Chroma collection"""
+    if collection is None:
+        return None
+    if backend == "numpy":
+        return NumpyBackend.from_collection(collection)
+    if backend != "chroma":
+        logger.warning(f"Unknown RAG_BACKEND '{backend}', using chroma")
+    return ChromaBackend(collection)
@@ -2,18 +2,19 @@ import requests
 import os
 import json
 from dotenv import load_dotenv
-# Import RAG components
-try:
-    from rag.rag_retrieval import get_rag_retrieval, get_knowledge_context
-    RAG_AVAILABLE = True
-except ImportError:
+# Import RAG components (chromadb and the embedding model load on first use)
+from rag import rag_dependencies_available
+RAG_AVAILABLE = rag_dependencies_available()
+if RAG_AVAILABLE:
+    from rag.rag_retrieval import get_rag_retrieval
+    from rag.answer_cache import get_answer_cache
+else:
     print("RAG components not available. Financial queries will work without RAG enhancement.")
-    RAG_AVAILABLE = False
 
 load_dotenv()
 
 GROQ_API_KEY = os.getenv('GROQ_API_KEY')
-GROQ_URL = "https://api.groq.com/openai/v1/chat/completions"
+GROQ_URL = os.getenv('GROQ_URL', "https://api.groq.com/openai/v1/chat/completions")  # Override to point at a local stand-in
 
 # ============= UTILITY FORMATTING FUNCTIONS =============
 
@@ -364,12 +365,10 @@ def format_top_movers_response(data, asset_type, count):
 
 # ============= CHATBOT RESPONSE FUNCTIONS =============
 
-def answer_financial_query(user_input):
-    """Answer general financial questions using Groq with RAG enhancement"""
-    if not GROQ_API_KEY:
-        return "I apologize, but I need API access to answer financial questions right now."
-    
-    # Get RAG context if available
+GREETING_FALLBACK = "Hello! I'm your financial assistant. I can help you with stock prices, crypto data, forex rates, and financial questions. How can I assist you today?"
+
+def get_rag_context(user_input):
+    """Return formatted knowledge-base context for a query, or "" if nothing relevant"""
     rag_context = ""
     if RAG_AVAILABLE:
         try:
@@ -383,12 +382,10 @@ def answer_financial_query(user_input):
                     print(f"DEBUG - RAG search completed but low relevance (max: {search_result.get('max_similarity', 0):.2f})")
         except Exception as e:
             print(f"DEBUG - RAG search error: {e}")
-    
-    headers = {
-        "Authorization": f"Bearer {GROQ_API_KEY}",
-        "Content-Type": "application/json"
-    }
-    
+    return rag_context
+
+def build_financial_query_payload(user_input, rag_context=""):
+    """Build the Groq request payload for an educational financial question"""
     # Enhanced prompt with RAG context
     base_prompt = """You are a knowledgeable financial advisor AI with expertise in stocks, cryptocurrency, forex, and financial markets. 
 Answer the user's financial question clearly and comprehensively. Be concise and direct.
@@ -416,7 +413,7 @@ If the provided knowledge is relevant, incorporate it naturally into your answer
 
 User question: {user_input}"""
     
-    payload = {
+    return {
         "model": "llama-3.1-8b-instant",
         "messages": [
             {"role": "user", "content": prompt}
@@ -424,24 +421,9 @@ User question: {user_input}"""
         "temperature": 0.7,
         "max_tokens": 400  # Increased for RAG-enhanced responses
     }
-    
-    try:
-        response = requests.post(GROQ_URL, headers=headers, json=payload, timeout=15)
-        response.raise_for_status()
-        return response.json()['choices'][0]['message']['content'].strip()
-    except Exception as e:
-        return f"I apologize, but I'm having trouble processing your financial query right now. Error: {e}"
 
-def handle_greetings_conversation(user_input):
-    """Handle greetings and general conversation using Groq"""
-    if not GROQ_API_KEY:
-        return "Hello! I'm your financial assistant. I can help you with stock prices, crypto data, forex rates, and financial questions. How can I assist you today?"
-    
-    headers = {
-        "Authorization": f"Bearer {GROQ_API_KEY}",
-        "Content-Type": "application/json"
-    }
-    
+def build_greeting_payload(user_input):
+    """Build the Groq request payload for greetings and small talk"""
     prompt = f"""
     You are a friendly financial chatbot assistant. Respond to this greeting/conversation in a warm, 
     professional way. Keep it brief and guide the conversation toward how you can help with financial 
@@ -450,7 +432,7 @@ def handle_greetings_conversation(user_input):
     User message: {user_input}
     """
     
-    payload = {
+    return {
         "model": "llama-3.1-8b-instant",
         "messages": [
             {"role": "user", "content": prompt}
@@ -458,10 +440,157 @@ def handle_greetings_conversation(user_input):
         "temperature": 0.8,
         "max_tokens": 200
     }
+
+def _groq_headers():
+    return {
+        "Authorization": f"Bearer {GROQ_API_KEY}",
+        "Content-Type": "application/json"
+    }
+
+def stream_groq_completion(payload, timeout=15):
+    """Yield content deltas from a streaming (stream=True) Groq chat completion"""
+    payload = dict(payload, stream=True)
+    with requests.post(GROQ_URL, headers=_groq_headers(), json=payload, timeout=timeout, stream=True) as response:
+        response.raise_for_status()
+        for line in response.iter_lines():
+            # OpenAI-compatible SSE: "data: {json}" lines, terminated by "data: [DONE]"
+            if not line or not line.startswith(b'data:'):
+                continue
+            data = line[5:].strip()
+            if data == b'[DONE]':
+                break
+            chunk = json.loads(data.decode('utf-8'))
+            choices = chunk.get('choices') or [{}]
+            delta = choices[0].get('delta', {}).get('content')
+            if delta:
+                yield delta
+
+def get_cached_answer(user_input):
+    """Look up a previously generated answer to an equivalent question"""
+    if not RAG_AVAILABLE:
+        return None
+    try:
+        cache = get_answer_cache()
+        return cache.lookup(user_input) if cache else None
+    except Exception as e:
+        print(f"DEBUG - Answer cache lookup error: {e}")
+        return None
+
+def cache_answer(user_input, answer):
+    """Store a generated answer in the semantic answer cache"""
+    if not RAG_AVAILABLE:
+        return
+    try:
+        cache = get_answer_cache()
+        if cache:
+            cache.store(user_input, answer)
+    except Exception as e:
+        print(f"DEBUG - Answer cache store error: {e}")
+
+def answer_financial_query(user_input, draft_answer=None):
+    """Answer general financial questions using Groq with RAG enhancement.
+
+    draft_answer is the reply drafted by the intent classifier, which only
+    drafts educational answers when RAG is unavailable. It is returned as-is
+    when there is no knowledge-base context; otherwise the context goes into a
+    single grounded Groq call.
+    """
+    if not GROQ_API_KEY:
+        return "I apologize, but I need API access to answer financial questions right now."
+    
+    cached = get_cached_answer(user_input)
+    if cached:
+        print("DEBUG - Serving answer from semantic cache")
+        return cached
+    
+    rag_context = get_rag_context(user_input)
+    
+    if draft_answer and not rag_context:
+        answer = draft_answer.strip()
+        cache_answer(user_input, answer)
+        return answer
+    
+    payload = build_financial_query_payload(user_input, rag_context)
+    
+    try:
+        response = requests.post(GROQ_URL, headers=_groq_headers(), json=payload, timeout=15)
+        response.raise_for_status()
+        answer = response.json()['choices'][0]['message']['content'].strip()
+        cache_answer(user_input, answer)
+        return answer
+    except Exception as e:
+        return f"I apologize, but I'm having trouble processing your financial query right now. Error: {e}"
+
+def stream_financial_query(user_input, draft_answer=None):
+    """Streaming variant of answer_financial_query; yields the answer in text chunks"""
+    if not GROQ_API_KEY:
+        yield "I apologize, but I need API access to answer financial questions right now."
+        return
+    
+    cached = get_cached_answer(user_input)
+    if cached:
+        print("DEBUG - Serving answer from semantic cache")
+        yield cached
+        return
     
+    rag_context = get_rag_context(user_input)
+    
+    if draft_answer and not rag_context:
+        answer = draft_answer.strip()
+        cache_answer(user_input, answer)
+        yield answer
+        return
+    
+    payload = build_financial_query_payload(user_input, rag_context)
+    
+    chunks = []
     try:
-        response = requests.post(GROQ_URL, headers=headers, json=payload, timeout=15)
+        for delta in stream_groq_completion(payload):
+            chunks.append(delta)
+            yield delta
+        cache_answer(user_input, ''.join(chunks).strip())
+    except Exception as e:
+        print(f"DEBUG - Financial query stream error: {e}")
+        if chunks:
+            # Part of the answer was already sent: let the caller emit an error event
+            raise
+        yield f"I apologize, but I'm having trouble processing your financial query right now. Error: {e}"
+
+def handle_greetings_conversation(user_input, draft_answer=None):
+    """Handle greetings and general conversation using Groq"""
+    if draft_answer:
+        return draft_answer.strip()
+    
+    if not GROQ_API_KEY:
+        return GREETING_FALLBACK
+    
+    payload = build_greeting_payload(user_input)
+    
+    try:
+        response = requests.post(GROQ_URL, headers=_groq_headers(), json=payload, timeout=15)
         response.raise_for_status()
         return response.json()['choices'][0]['message']['content'].strip()
     except Exception as e:
-        return "Hello! I'm your financial assistant. I can help you with stock prices, crypto data, forex rates, and financial questions. How can I assist you today?"
\ No newline at end of file
+        return GREETING_FALLBACK
+
+def stream_greetings_conversation(user_input, draft_answer=None):
+    """Streaming variant of handle_greetings_conversation; yields the reply in text chunks"""
+    if draft_answer:
+        yield draft_answer.strip()
+        return
+    
+    if not GROQ_API_KEY:
+        yield GREETING_FALLBACK
+        return
+    
+    streamed_any = False
+    try:
+        for delta in stream_groq_completion(build_greeting_payload(user_input)):
+            streamed_any = True
+            yield delta
+    except Exception as e:
+        print(f"DEBUG - Greeting stream error: {e}")
+        if streamed_any:
+            # Part of the reply was already sent: let the caller emit an error event
+            raise
+        yield GREETING_FALLBACK
@@ -1,40 +1,600 @@
 import requests
 import os
-import pandas as pd
-import matplotlib.pyplot as plt
 import io
-import base64
+import hashlib
+import hmac
+import secrets
+import re
+import threading
+import time
+import multiprocessing
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
-import matplotlib
-matplotlib.use('Agg')  # Use non-interactive backend
+# matplotlib and pandas are imported inside the chart functions: together
+# they take most of a second to import and only chart requests need them
 
 # Load environment variables
 load_dotenv()
 
-def create_price_chart(symbol, time_period, asset_type):
-    """Create price charts for stocks and crypto using CoinGecko and Alpha Vantage APIs"""
+# Chart rendering processes (0 renders in the request thread)
+CHART_RENDER_WORKERS = int(os.getenv('CHART_RENDER_WORKERS', '2'))
+# Renders running or waiting before new chart requests get a "busy" reply
+CHART_QUEUE_SIZE = int(os.getenv('CHART_QUEUE_SIZE', '8'))
+CHART_RENDER_TIMEOUT = float(os.getenv('CHART_RENDER_TIMEOUT', '10'))
+
+# Rendered chart cache, bounded by total PNG size
+CHART_CACHE_ENABLED = os.getenv('CHART_CACHE_ENABLED', 'true').lower() == 'true'
+CHART_CACHE_MAX_BYTES = int(os.getenv('CHART_CACHE_MAX_BYTES', str(64 * 1024 * 1024)))
+
+# Seconds a cached chart stays fresh, per period: short periods move faster
+CHART_FRESHNESS_SECONDS = {"1d": 60, "7d": 900, "30d": 3600, "90d": 3600, "1y": 86400}
+# Seconds a failed fetch (unknown symbol, rate limit) is remembered before retrying upstream
+CHART_FAILURE_TTL = float(os.getenv('CHART_FAILURE_TTL', '30'))
+
+# Key signing chart ids, so /chart only serves charts this app issued. The
+# random default is shared by gunicorn workers (preload_app); set it when
+# several servers answer /chart for the same clients
+CHART_ID_SECRET = (os.getenv('CHART_ID_SECRET') or secrets.token_hex(32)).encode()
+
+CHART_IMAGE_FORMATS = {'png': 'image/png', 'webp': 'image/webp'}
+
+# "image": server-rendered PNG; "data"/"ohlc": price series drawn by the client
+CHART_MODES = ("image", "data", "ohlc")
+CHART_DATA_POINTS = int(os.getenv('CHART_DATA_POINTS', '300'))
+CHART_DATA_MAX_POINTS = int(os.getenv('CHART_DATA_MAX_POINTS', '2000'))
+CHART_ASSET_TYPES = ("crypto", "stock")
+_CHART_SYMBOL = re.compile(r'^[A-Za-z0-9.^=-]{1,20}$')
+
+# Per-thread chart figure, reused across requests (see _chart_template)
+_chart_local = threading.local()
+
+def _chart_template():
+    """Return this thread's reusable price-chart figure.
+
+    Charts are drawn on explicit Figure/FigureCanvasAgg objects instead of
+    pyplot, which keeps a process-wide current figure and is not safe with
+    concurrent requests. Each thread builds its figure, axes, line, date
+    locator and formatters once; a render only swaps data, title and color.
+    """
+    template = getattr(_chart_local, 'template', None)
+    if template is None:
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        from matplotlib.dates import AutoDateLocator, AutoDateFormatter
+        from matplotlib.ticker import FuncFormatter, ScalarFormatter
+
+        fig = Figure(figsize=(12, 6), layout='tight')
+        FigureCanvasAgg(fig)
+        ax = fig.add_subplot()
+        ax.set_xlabel('Date')
+        ax.set_ylabel('Price (USD)')
+        ax.grid(True, alpha=0.3)
+        ax.tick_params(axis='x', labelrotation=45)
+
+        locator = AutoDateLocator()
+        ax.xaxis.set_major_locator(locator)
+        ax.xaxis.set_major_formatter(AutoDateFormatter(locator))
+
+        line, = ax.plot([], [], linewidth=2)
+        template = _chart_local.template = {
+            'figure': fig,
+            'axes': ax,
+            'line': line,
+            'title': ax.set_title('', fontsize=16, fontweight='bold'),
+            'formatters': {
+                'usd': FuncFormatter(lambda x, p: f'${x:.2f}'),
+                'plain': ScalarFormatter()
+            }
+        }
+    return template
+
+def render_price_chart(times, prices, title, color, price_format='plain'):
+    """Render a price line chart and return it as PNG bytes (thread-safe)"""
+    from matplotlib.dates import date2num
+
+    template = _chart_template()
+    ax = template['axes']
+    template['line'].set_data(date2num(times), prices)
+    template['line'].set_color(color)
+    template['title'].set_text(title)
+    ax.yaxis.set_major_formatter(template['formatters'][price_format])
+    ax.relim()
+    ax.autoscale_view()
+
+    img = io.BytesIO()
+    template['figure'].savefig(img, format='png', dpi=150, bbox_inches='tight')
+    return img.getvalue()
+
+class ChartBusyError(Exception):
+    """Raised when the chart render queue is full"""
+
+class ChartRenderPool:
+    """Renders charts in worker processes behind a bounded queue.
+
+    Rendering holds the GIL for hundreds of milliseconds, so it runs in a
+    separate process pool. At most queue_size renders may be running or
+    waiting; beyond that render() raises ChartBusyError right away instead of
+    queuing. A queue slot is freed when its render actually finishes, even if
+    the caller already gave up after timeout seconds.
+    """
+
+    def __init__(self, workers=CHART_RENDER_WORKERS, queue_size=CHART_QUEUE_SIZE, timeout=CHART_RENDER_TIMEOUT):
+        self.workers = workers
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self._executor = None
+        self._slots = threading.BoundedSemaphore(queue_size)
+        self._lock = threading.Lock()
+
+        self.queue_depth = 0
+        self.rendered = 0
+        self.rejected = 0
+        self.timeouts = 0
+        self.failed = 0
+        self.render_seconds = 0.0
+        self._completed_at = deque()  # completion times within the rate window
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                # forkserver/spawn: never fork a threaded server process
+                methods = multiprocessing.get_all_start_methods()
+                context = multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+                self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=context)
+            return self._executor
+
+    def _finished(self, started, failed=False):
+        now = time.monotonic()
+        with self._lock:
+            self.queue_depth -= 1
+            if failed:
+                self.failed += 1
+            else:
+                self.rendered += 1
+                self.render_seconds += now - started
+                self._completed_at.append(now)
+        self._slots.release()
+
+    def render(self, *args, **kwargs):
+        """render_price_chart(*args, **kwargs) in the pool; returns PNG bytes"""
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            raise ChartBusyError("Chart render queue is full")
+        with self._lock:
+            self.queue_depth += 1
+        started = time.monotonic()
+
+        if self.workers <= 0:
+            try:
+                png = render_price_chart(*args, **kwargs)
+            except Exception:
+                self._finished(started, failed=True)
+                raise
+            self._finished(started)
+            return png
+
+        try:
+            future = self._get_executor().submit(render_price_chart, *args, **kwargs)
+        except Exception:
+            self._finished(started, failed=True)
+            raise
+        future.add_done_callback(lambda f: self._finished(started, failed=f.exception() is not None))
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            with self._lock:
+                self.timeouts += 1
+            raise
+        except BrokenProcessPool:
+            # A render process died: start a fresh pool on the next request
+            with self._lock:
+                if self._executor is not None:
+                    self._executor.shutdown(wait=False)
+                    self._executor = None
+            raise
+
+    def stats(self, window_seconds=60.0):
+        now = time.monotonic()
+        with self._lock:
+            while self._completed_at and now - self._completed_at[0] > window_seconds:
+                self._completed_at.popleft()
+            return {
+                'workers': self.workers,
+                'queue_size': self.queue_size,
+                'queue_depth': self.queue_depth,
+                'rendered': self.rendered,
+                'rejected': self.rejected,
+                'timeouts': self.timeouts,
+                'failed': self.failed,
+                'rendered_per_sec': len(self._completed_at) / window_seconds,
+                'mean_render_ms': (self.render_seconds / self.rendered * 1000) if self.rendered else 0.0
+            }
+
+# Global instance for easy access
+_chart_render_pool = None
+_chart_render_pool_lock = threading.Lock()
+
+def get_chart_render_pool():
+    """Get global chart render pool"""
+    global _chart_render_pool
+    if _chart_render_pool is None:
+        with _chart_render_pool_lock:
+            if _chart_render_pool is None:
+                _chart_render_pool = ChartRenderPool()
+    return _chart_render_pool
+
+class ChartCache:
+    """LRU cache of rendered charts, bounded by the total size of their PNGs.
+
+    Keys are (symbol, period, asset type, freshness bucket). The bucket is
+    the current time divided by the period's freshness interval
+    (CHART_FRESHNESS_SECONDS), so a 1d chart is rebuilt every minute and a
+    30d chart every hour without any explicit expiry. Concurrent misses on
+    the same key wait for a single fetch and render instead of repeating it.
+    Failed fetches can be remembered for failure_ttl seconds, so a bad
+    symbol does not hit the upstream API on every request.
+    """
+
+    def __init__(self, max_bytes=CHART_CACHE_MAX_BYTES, freshness=CHART_FRESHNESS_SECONDS,
+                 failure_ttl=CHART_FAILURE_TTL):
+        self.max_bytes = max_bytes
+        self.freshness = freshness
+        self.failure_ttl = failure_ttl
+        self._entries = OrderedDict()  # key -> result dict holding 'png'
+        self._failures = {}  # key -> (expiry time, failed result)
+        self._inflight = {}  # key -> lock held while the chart is being built
+        self._lock = threading.Lock()
+        self.size_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def bucket(self, time_period, now=None):
+        return int((time.time() if now is None else now) // self.freshness.get(time_period, 3600))
+
+    def seconds_left(self, time_period, now=None):
+        """Seconds until the current bucket of time_period ends"""
+        interval = self.freshness.get(time_period, 3600)
+        now = time.time() if now is None else now
+        return max(1, int(interval - now % interval))
+
+    def key(self, symbol, time_period, asset_type, now=None):
+        return (symbol.upper(), time_period, asset_type, self.bucket(time_period, now))
+
+    @staticmethod
+    def _entry_size(entry):
+        """Bytes held by an entry: its images and price arrays"""
+        return sum(len(value) if isinstance(value, bytes) else getattr(value, 'nbytes', 0)
+                   for value in entry.values())
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                failure = self._failures.get(key)
+                if failure is not None and failure[0] > time.monotonic():
+                    self.hits += 1
+                    return failure[1]
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, entry):
+        size = self._entry_size(entry)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self.size_bytes -= self._entry_size(self._entries.pop(key))
+            self._entries[key] = entry
+            self.size_bytes += size
+            while self.size_bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.size_bytes -= self._entry_size(evicted)
+                self.evictions += 1
+
+    def _put_failure(self, key, entry):
+        if self.failure_ttl <= 0:
+            return
+        now = time.monotonic()
+        with self._lock:
+            for stale in [k for k, (expiry, _) in self._failures.items() if expiry <= now]:
+                del self._failures[stale]
+            self._failures[key] = (now + self.failure_ttl, entry)
+
+    def get_or_create(self, key, create_fn, cache_failures=False):
+        """Cached entry for key, calling create_fn() once on a miss.
+
+        Failures are only cached, for failure_ttl, with cache_failures; render
+        failures (busy, timed out) are worth retrying right away.
+        """
+        entry = self.get(key)
+        if entry is not None:
+            return entry
+
+        with self._lock:
+            building = self._inflight.setdefault(key, threading.Lock())
+        with building:
+            # Another request may have built it while we waited
+            entry = self.get(key)
+            if entry is not None:
+                return entry
+            with self._lock:
+                self.misses += 1
+            try:
+                entry = create_fn()
+                if entry.get('success'):
+                    self.put(key, entry)
+                elif cache_failures:
+                    self._put_failure(key, entry)
+                return entry
+            finally:
+                with self._lock:
+                    self._inflight.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._failures.clear()
+            self.size_bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'failures': len(self._failures),
+                'size_bytes': self.size_bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions
+            }
+
+# Global instance for easy access
+_chart_cache = None
+_chart_cache_lock = threading.Lock()
+
+def _new_chart_cache():
+    """Cache instance for the current settings; with caching disabled nothing is ever stored"""
+    return ChartCache(max_bytes=CHART_CACHE_MAX_BYTES if CHART_CACHE_ENABLED else 0)
+
+def get_chart_cache():
+    """Get global rendered chart cache"""
+    global _chart_cache
+    if _chart_cache is None:
+        with _chart_cache_lock:
+            if _chart_cache is None:
+                _chart_cache = _new_chart_cache()
+    return _chart_cache
+
+def _chart_id_signature(name):
+    return hmac.new(CHART_ID_SECRET, name.encode(), hashlib.sha256).hexdigest()[:16]
+
+def make_chart_id(symbol, time_period, asset_type, bucket):
+    """Public chart id: "<asset type>-<SYMBOL>-<period>-<bucket>-<signature>".
+
+    The id names the chart rather than a cache slot, so any worker process
+    can rebuild the image even if another worker rendered it. The HMAC
+    signature keeps clients from making up ids for arbitrary symbols, each
+    of which would cost an upstream API call and a render.
+    """
+    name = f"{asset_type}-{symbol.upper()}-{time_period}-{bucket}"
+    return f"{name}-{_chart_id_signature(name)}"
+
+def parse_chart_id(chart_id):
+    """(symbol, time_period, asset_type, bucket) for a valid, correctly signed chart id, else None"""
+    name, _, signature = chart_id.rpartition('-')
+    if not hmac.compare_digest(signature, _chart_id_signature(name)):
+        return None
+    asset_type, _, rest = name.partition('-')
+    parts = rest.rsplit('-', 2)
+    if asset_type not in CHART_ASSET_TYPES or len(parts) != 3:
+        return None
+    symbol, time_period, bucket = parts
+    if not _CHART_SYMBOL.match(symbol) or time_period not in CHART_FRESHNESS_SECONDS or not bucket.isdigit():
+        return None
+    return symbol, time_period, asset_type, int(bucket)
+
+def _render_series(series):
+    """Render fetched chart data; the result holds the PNG bytes under 'png'"""
     try:
-        # Calculate date range
-        days_map = {"1d": 1, "7d": 7, "30d": 30, "90d": 90, "1y": 365}
-        days = days_map.get(time_period, 30)
+        png = get_chart_render_pool().render(series['times'], series['prices'], series['title'],
+                                             series['color'], price_format=series['price_format'])
+    except ChartBusyError:
+        return {'success': False, 'busy': True,
+                'error': 'Chart rendering is busy right now. Please try again in a few seconds.'}
+    except FutureTimeoutError:
+        return {'success': False, 'error': 'Chart rendering timed out. Please try again.'}
+
+    return {
+        'success': True,
+        'png': png,
+        'etag': hashlib.sha1(png).hexdigest(),
+        'current_price': series['current_price'],
+        'price_change': series['price_change'],
+        'symbol': series['symbol']
+    }
+
+def _fetch_series(symbol, time_period, asset_type):
+    """Fetch the price series for one chart (uncached)"""
+    # Calculate date range
+    days_map = {"1d": 1, "7d": 7, "30d": 30, "90d": 90, "1y": 365}
+    days = days_map.get(time_period, 30)
+
+    if asset_type == "crypto":
+        return _fetch_crypto_series(symbol, time_period, days)
+
+    elif asset_type == "stock":
+        return _fetch_stock_series(symbol, time_period, days)
+
+    return {'success': False, 'error': 'Invalid asset type'}
+
+def _cached_series(symbol, time_period, asset_type):
+    # Full-resolution series, cached next to the images; downsampled per request
+    cache = get_chart_cache()
+    key = (*cache.key(symbol, time_period, asset_type), 'series')
+    return cache.get_or_create(key, lambda: _fetch_series(symbol, time_period, asset_type), cache_failures=True)
+
+def _build_chart(symbol, time_period, asset_type):
+    """Render one chart (uncached image; the series comes from the cache)"""
+    series = _cached_series(symbol, time_period, asset_type)
+    if not series['success']:
+        return series
+    return _render_series(series)
+
+def _cached_chart(symbol, time_period, asset_type):
+    cache = get_chart_cache()
+    key = cache.key(symbol, time_period, asset_type)
+    return key, cache.get_or_create(key, lambda: _build_chart(symbol, time_period, asset_type))
+
+def lttb_indices(x, y, n_out):
+    """Indices of the n_out points kept by Largest-Triangle-Three-Buckets downsampling.
+
+    The first and last points are always kept. The points in between are
+    split into n_out - 2 buckets, and from each bucket the point forming the
+    largest triangle with the previously kept point and the average of the
+    next bucket is kept, which preserves peaks and troughs far better than
+    taking every k-th point.
+    """
+    import numpy as np
+
+    n = len(y)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(int)
+    selected = np.empty(n_out, dtype=int)
+    selected[0], selected[-1] = 0, n - 1
+
+    a = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+        if i == n_out - 3:
+            avg_x, avg_y = x[n - 1], y[n - 1]
+        else:
+            avg_x, avg_y = x[end:edges[i + 2]].mean(), y[end:edges[i + 2]].mean()
+        area = np.abs((x[a] - avg_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (avg_y - y[a]))
+        a = start + int(np.argmax(area))
+        selected[i + 1] = a
+    return selected
+
+def _aggregate_ohlc(series, n_out):
+    """Merge consecutive candles into at most n_out candles (first open, max high, min low, last close)"""
+    import numpy as np
+
+    n = len(series['prices'])
+    if n_out >= n:
+        return series['times'], series['opens'], series['highs'], series['lows'], series['prices']
+    starts = np.linspace(0, n, n_out + 1).astype(int)[:-1]
+    ends = np.append(starts[1:], n)
+    return (series['times'][starts], series['opens'][starts],
+            np.maximum.reduceat(series['highs'], starts), np.minimum.reduceat(series['lows'], starts),
+            series['prices'][ends - 1])
+
+def _series_payload(series, mode, max_points):
+    """Compact JSON-ready price arrays: t (unix seconds) and c, plus o/h/l in ohlc mode"""
+    import numpy as np
+
+    max_points = max(3, min(int(max_points), CHART_DATA_MAX_POINTS))
+    seconds = series['times'].astype('datetime64[s]').astype(np.int64)
+
+    if mode == 'ohlc' and 'opens' in series:
+        times, opens, highs, lows, closes = _aggregate_ohlc({**series, 'times': seconds}, max_points)
+        payload = {'t': times.tolist(), 'o': opens.tolist(), 'h': highs.tolist(),
+                   'l': lows.tolist(), 'c': closes.tolist()}
+    else:
+        keep = lttb_indices(seconds, series['prices'], max_points)
+        payload = {'t': seconds[keep].tolist(), 'c': series['prices'][keep].tolist()}
+
+    payload.update(title=series['title'], color=series['color'], price_format=series['price_format'])
+    return payload
+
+def create_price_chart(symbol, time_period, asset_type, mode='image', max_points=CHART_DATA_POINTS):
+    """Create price charts for stocks and crypto using CoinGecko and Alpha Vantage APIs.
+
+    Only the price series is fetched here. In "image" mode nothing is
+    rendered either: 'chart_id' names the chart for get_chart_image, which
+    renders it when /chart/<chart_id>.png is requested. In "data" and
+    "ohlc" modes 'series' holds the prices downsampled to at most
+    max_points points for the client to draw.
+    """
+    try:
+        cache = get_chart_cache()
+        key = cache.key(symbol, time_period, asset_type)
+        series = _cached_series(symbol, time_period, asset_type)
+        if not series['success']:
+            return series
 
-        if asset_type == "crypto":
-            return _create_crypto_chart(symbol, time_period, days)
-        
-        elif asset_type == "stock":
-            return _create_stock_chart(symbol, time_period, days)
+        chart = {
+            'success': True,
+            'current_price': series['current_price'],
+            'price_change': series['price_change'],
+            'symbol': series['symbol']
+        }
+        if mode in ('data', 'ohlc'):
+            chart['series'] = _series_payload(series, mode, max_points)
+        else:
+            chart['chart_id'] = make_chart_id(*key)
+        return chart
+
+    except Exception as e:
+        return {'success': False, 'error': f'Error creating chart: {str(e)}'}
+
+def _to_webp(png):
+    from PIL import Image  # installed with matplotlib
+
+    with Image.open(io.BytesIO(png)) as image:
+        img = io.BytesIO()
+        image.save(img, format='WEBP', lossless=True)
+        return img.getvalue()
 
-        return {'success': False, 'error': 'Invalid asset type'}
+def get_chart_image(chart_id, image_format='png'):
+    """Image bytes for a chart id from create_price_chart.
+
+    Returns {'success', 'data', 'mimetype', 'etag', 'max_age'}. A chart from
+    an older freshness bucket is answered with the current chart and
+    max_age 0, so browsers revalidate instead of keeping stale prices.
+    """
+    parsed = parse_chart_id(chart_id)
+    if parsed is None or image_format not in CHART_IMAGE_FORMATS:
+        return {'success': False, 'not_found': True, 'error': 'Unknown chart'}
+    symbol, time_period, asset_type, bucket = parsed
+
+    try:
+        key, result = _cached_chart(symbol, time_period, asset_type)
+        if not result['success']:
+            return result
+
+        data = result['png']
+        if image_format == 'webp':
+            data = result.get('webp')
+            if data is None:
+                data = _to_webp(result['png'])
+                get_chart_cache().put(key, {**result, 'webp': data})
+
+        cache = get_chart_cache()
+        current = key[3] == bucket
+        return {
+            'success': True,
+            'data': data,
+            'mimetype': CHART_IMAGE_FORMATS[image_format],
+            'etag': f"{result['etag']}-{image_format}",
+            'max_age': cache.seconds_left(time_period) if current else 0
+        }
 
     except Exception as e:
         return {'success': False, 'error': f'Error creating chart: {str(e)}'}
 
-def _create_crypto_chart(symbol, time_period, days):
-    """1-day crypto chart via CryptoCompare (you have API key)"""
-    import traceback, requests, io, base64, matplotlib
-    matplotlib.use('Agg')
-    import matplotlib.pyplot as plt
+def _fetch_crypto_series(symbol, time_period, days):
+    """Crypto chart data via CryptoCompare (you have API key)"""
+    import traceback
     import pandas as pd
     from dotenv import load_dotenv
     load_dotenv()
@@ -68,26 +628,17 @@ def _create_crypto_chart(symbol, time_period, days):
         df['time'] = pd.to_datetime(df['time'], unit='s')
         df = df.sort_values('time')
 
-        # ---- 3. plot ----
-        plt.figure(figsize=(12, 6))
-        plt.plot(df['time'], df['close'], color='#f7931a', linewidth=2)
-        plt.title(f'{symbol.upper()} Price Chart ({time_period})', fontsize=16, fontweight='bold')
-        plt.xlabel('Date')
-        plt.ylabel('Price (USD)')
-        plt.grid(True, alpha=0.3)
-        plt.xticks(rotation=45)
-        plt.tight_layout()
-
-        img = io.BytesIO()
-        plt.savefig(img, format='png', dpi=150, bbox_inches='tight')
-        plt.close()
-        img.seek(0)
-        b64 = base64.b64encode(img.read()).decode()
-
-        # ---- 4. same return shape ----
+        # ---- 3. chart data (rendered by _render_series) ----
         return {
             'success': True,
-            'chart_data': b64,
+            'times': df['time'].to_numpy(),
+            'prices': df['close'].to_numpy(dtype=float),
+            'opens': df['open'].to_numpy(dtype=float),
+            'highs': df['high'].to_numpy(dtype=float),
+            'lows': df['low'].to_numpy(dtype=float),
+            'title': f'{symbol.upper()} Price Chart ({time_period})',
+            'color': '#f7931a',
+            'price_format': 'plain',
             'current_price': float(df['close'].iloc[-1]),
             'price_change': float(((df['close'].iloc[-1] - df['close'].iloc[0]) / df['close'].iloc[0] * 100)),
             'symbol': symbol.upper()
@@ -99,8 +650,10 @@ def _create_crypto_chart(symbol, time_period, days):
         return {'success': False, 'error': f'Crypto chart error: {e}'}
     
 
-def _create_stock_chart(symbol, time_period, days):
-    """Create stock price chart using Alpha Vantage API"""
+def _fetch_stock_series(symbol, time_period, days):
+    """Stock chart data via Alpha Vantage API"""
+    import pandas as pd
+
     try:
         alpha_vantage_api_key = os.getenv('ALPHA_VANTAGE_API_KEY')
         if not alpha_vantage_api_key:
@@ -168,6 +721,7 @@ def _create_stock_chart(symbol, time_period, days):
             # Convert to DataFrame
             dates = []
             prices = []
+            opens, highs, lows = [], [], []
             
             # Sort by date and limit to requested period
             sorted_dates = sorted(time_series.keys(), reverse=True)
@@ -179,8 +733,13 @@ def _create_stock_chart(symbol, time_period, days):
                     else:
                         date_obj = datetime.strptime(date_str, '%Y-%m-%d')
                     
+                    bar = time_series[date_str]
+                    close = float(bar['4. close'])
+                    opens.append(float(bar.get('1. open', close)))
+                    highs.append(float(bar.get('2. high', close)))
+                    lows.append(float(bar.get('3. low', close)))
                     dates.append(date_obj)
-                    prices.append(float(time_series[date_str]['4. close']))
+                    prices.append(close)
                 except (ValueError, KeyError) as e:
                     print(f"DEBUG - Error parsing date {date_str}: {e}")
                     continue
@@ -191,7 +750,10 @@ def _create_stock_chart(symbol, time_period, days):
             # Create DataFrame and sort by date (ascending)
             df = pd.DataFrame({
                 'date': dates,
-                'price': prices
+                'price': prices,
+                'open': opens,
+                'high': highs,
+                'low': lows
             }).sort_values('date')
 
             # Limit to requested time period
@@ -201,27 +763,17 @@ def _create_stock_chart(symbol, time_period, days):
 
             print(f"DEBUG - Final dataset: {len(df)} data points from {df['date'].min()} to {df['date'].max()}")
 
-            # Create chart
-            plt.figure(figsize=(12, 6))
-            plt.plot(df['date'], df['price'], linewidth=2, color='#1f77b4')
-            plt.title(f'{symbol.upper()} Stock Price Chart ({time_period})', fontsize=16, fontweight='bold')
-            plt.xlabel('Date')
-            plt.ylabel('Price (USD)')
-            plt.grid(True, alpha=0.3)
-            plt.xticks(rotation=45)
-            plt.gca().yaxis.set_major_formatter(plt.FuncFormatter(lambda x, p: f'${x:.2f}'))
-            plt.tight_layout()
-
-            # Save to base64
-            img_buffer = io.BytesIO()
-            plt.savefig(img_buffer, format='png', dpi=150, bbox_inches='tight')
-            img_buffer.seek(0)
-            chart_b64 = base64.b64encode(img_buffer.read()).decode()
-            plt.close()
-
+            # Chart data (rendered by _render_series)
             return {
                 'success': True,
-                'chart_data': chart_b64,
+                'times': df['date'].to_numpy(),
+                'prices': df['price'].to_numpy(dtype=float),
+                'opens': df['open'].to_numpy(dtype=float),
+                'highs': df['high'].to_numpy(dtype=float),
+                'lows': df['low'].to_numpy(dtype=float),
+                'title': f'{symbol.upper()} Stock Price Chart ({time_period})',
+                'color': '#1f77b4',
+                'price_format': 'usd',
                 'current_price': df['price'].iloc[-1],
                 'price_change': ((df['price'].iloc[-1] - df['price'].iloc[0]) / df['price'].iloc[0] * 100),
                 'symbol': symbol.upper()